@@ -0,0 +1,318 @@
+"""
+Benchmarks for the hot paths of every game
+Times each benchmark, reports throughput, latency percentiles and peak
+memory as JSON, and compares the results against a stored baseline.
+
+python benchmark.py --output results.json
+python benchmark.py --save-baseline baseline.json
+python benchmark.py --baseline baseline.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+
+# Each benchmark runs for at least MIN_TIME seconds and MIN_ITERATIONS
+# calls, and at most MAX_ITERATIONS calls
+MIN_TIME = 1.0
+MIN_ITERATIONS = 5
+MAX_ITERATIONS = 100000
+
+# Relative change in ops/sec or median latency that counts as a regression
+TOLERANCE = 0.2
+
+# Latency changes smaller than this are timer noise, not regressions
+LATENCY_RESOLUTION_MS = 0.01
+
+# Simulated seconds per Cookie Clicker benchmark game
+CLICKER_DURATION = 100000.0
+
+# Yahtzee configurations as (held dice, sides, free dice) and (hand, sides)
+EXPECTED_VALUE_CASES = [((), 6, 5), ((1, 1), 6, 3), ((), 4, 5), ((2, ), 8, 3)]
+STRATEGY_CASES = [((1, 1, 1, 5, 6), 6), ((1, 2, 3, 4), 4), ((2, 3, 5, 7, 8), 8)]
+
+
+def _merge_benchmark():
+    """
+    Merge random 2048 lines, one per call.
+    """
+    import week2_2048 as twenty
+
+    rng = random.Random(0)
+    lines = [[rng.choice([0, 0, 2, 2, 4, 8]) for dummy_col in range(4)]
+             for dummy_line in range(1000)]
+    state = {"index": 0}
+
+    def run():
+        state["index"] = (state["index"] + 1) % len(lines)
+        twenty.merge(lines[state["index"]])
+    return run
+
+
+def _move_benchmark():
+    """
+    Make random moves on a 4x4 2048 game, one per call, starting a new
+    game every 100 moves.
+    """
+    import week2_2048 as twenty
+
+    random.seed(0)
+    game = twenty.TwentyFortyEight(4, 4)
+    directions = [twenty.UP, twenty.DOWN, twenty.LEFT, twenty.RIGHT]
+    state = {"moves": 0}
+
+    def run():
+        state["moves"] += 1
+        if state["moves"] % 100 == 0:
+            game.reset()
+        game.move(random.choice(directions))
+    return run
+
+
+def _mc_trial_benchmark():
+    """
+    Play one random Tic-Tac-Toe game from an empty 3x3 board per call.
+    """
+    import week3_tic_tac_toe as ttt
+
+    random.seed(0)
+    board = ttt.provided.TTTBoard(3)
+
+    def run():
+        ttt.mc_trial(board.clone(), ttt.provided.PLAYERX)
+    return run
+
+
+def _mc_move_benchmark():
+    """
+    Choose the first move on a 3x3 board with NTRIALS playouts per call.
+    """
+    import week3_tic_tac_toe as ttt
+
+    random.seed(0)
+    board = ttt.provided.TTTBoard(3)
+
+    def run():
+        ttt.mc_move(board, ttt.provided.PLAYERX, ttt.NTRIALS)
+    return run
+
+
+def _expected_value_benchmark(held_dice, num_die_sides, num_free_dice):
+    """
+    Compute one Yahtzee expected value per call.
+    """
+    import week4_yahtzee as yahtzee
+
+    def run():
+        yahtzee.expected_value(held_dice, num_die_sides, num_free_dice)
+    return run
+
+
+def _strategy_benchmark(hand, num_die_sides):
+    """
+    Find the best hold for a Yahtzee hand per call, with an empty hold
+    cache so that every call does the full work.
+    """
+    import week4_yahtzee as yahtzee
+
+    def run():
+        yahtzee.HOLD_CACHE.clear()
+        yahtzee.strategy(hand, num_die_sides)
+    return run
+
+
+def _clicker_benchmark(strategy_name):
+    """
+    Simulate one Cookie Clicker game of CLICKER_DURATION seconds per call.
+    """
+    import week5_cookie_clicker_tournament as tournament
+
+    clicker = tournament.clicker
+    strategy = tournament.BUNDLED_STRATEGIES[strategy_name]
+
+    def run():
+        clicker.simulate_clicker(clicker.provided.BuildInfo(), CLICKER_DURATION,
+                                 strategy, clicker.HISTORY_OFF)
+    return run
+
+
+def _benchmarks():
+    """
+    Return a list of (name, setup function, arguments) for every
+    benchmark, where the setup function returns the callable to time.
+    """
+    benchmarks = [("2048.merge", _merge_benchmark, ()),
+                  ("2048.move", _move_benchmark, ()),
+                  ("ttt.mc_trial", _mc_trial_benchmark, ()),
+                  ("ttt.mc_move", _mc_move_benchmark, ())]
+    for held_dice, num_die_sides, num_free_dice in EXPECTED_VALUE_CASES:
+        name = "yahtzee.expected_value.%s+%dd%d" % ("".join(map(str, held_dice)) or "-",
+                                                    num_free_dice, num_die_sides)
+        benchmarks.append((name, _expected_value_benchmark,
+                           (held_dice, num_die_sides, num_free_dice)))
+    for hand, num_die_sides in STRATEGY_CASES:
+        name = "yahtzee.strategy.%dd%d" % (len(hand), num_die_sides)
+        benchmarks.append((name, _strategy_benchmark, (hand, num_die_sides)))
+    for strategy_name in ("Cursor", "Cheap", "Expensive", "Best"):
+        benchmarks.append(("clicker.simulate." + strategy_name, _clicker_benchmark,
+                           (strategy_name, )))
+    return benchmarks
+
+
+def _percentile(sorted_values, fraction):
+    """
+    Return the nearest-rank percentile of a sorted list.
+    """
+    rank = int(round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+def _peak_memory_kb():
+    """
+    Return the peak resident memory of this process in kilobytes, or
+    None where the resource module is not available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak
+
+
+def time_benchmark(func, min_time=MIN_TIME, min_iterations=MIN_ITERATIONS,
+                   max_iterations=MAX_ITERATIONS):
+    """
+    Call func repeatedly and time every call.
+
+    Returns a dict with the number of iterations, ops/sec and the p50
+    and p99 latencies in milliseconds
+    """
+    timer = timeit.default_timer
+    latencies = []
+    total = 0.0
+    while len(latencies) < max_iterations and (total < min_time or len(latencies) < min_iterations):
+        start = timer()
+        func()
+        latency = timer() - start
+        latencies.append(latency)
+        total += latency
+
+    latencies.sort()
+    return {"iterations": len(latencies),
+            "ops_per_sec": len(latencies) / total if total > 0 else float("inf"),
+            "p50_ms": 1000.0 * _percentile(latencies, 0.5),
+            "p99_ms": 1000.0 * _percentile(latencies, 0.99)}
+
+
+def _run_one(args):
+    """
+    Set up and time one benchmark.  Runs in a fresh worker process, so
+    that the peak memory belongs to this benchmark alone.
+
+    Returns the benchmark name and its results
+    """
+    name, setup, setup_args, min_time = args
+    result = time_benchmark(setup(*setup_args), min_time)
+    result["peak_rss_kb"] = _peak_memory_kb()
+    return name, result
+
+
+def run_benchmarks(name_filter=None, min_time=MIN_TIME, isolate=True):
+    """
+    Run every benchmark whose name contains name_filter, each in its
+    own worker process unless isolate is False.
+
+    Returns a dict with platform details and a dict of results by
+    benchmark name
+    """
+    tasks = [(name, setup, setup_args, min_time)
+             for name, setup, setup_args in _benchmarks()
+             if name_filter is None or name_filter in name]
+
+    if isolate:
+        import multiprocessing
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        try:
+            results = pool.map(_run_one, tasks, 1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_run_one(task) for task in tasks]
+
+    return {"python": platform.python_version(),
+            "platform": platform.platform(),
+            "benchmarks": dict(results)}
+
+
+def compare_results(results, baseline, tolerance=TOLERANCE):
+    """
+    Compare results from run_benchmarks with a baseline in the same
+    format.  Benchmarks missing from either side are skipped.
+
+    Returns a list of messages, one per regression
+    """
+    regressions = []
+    for name, result in sorted(results["benchmarks"].items()):
+        if name not in baseline["benchmarks"]:
+            continue
+        base = baseline["benchmarks"][name]
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append("%s: %.1f ops/sec, baseline %.1f"
+                               % (name, result["ops_per_sec"], base["ops_per_sec"]))
+        if (result["p50_ms"] > base["p50_ms"] * (1 + tolerance)
+                and result["p50_ms"] - base["p50_ms"] > LATENCY_RESOLUTION_MS):
+            regressions.append("%s: p50 %.3fms, baseline %.3fms"
+                               % (name, result["p50_ms"], base["p50_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    """
+    Run the benchmarks from the command line.
+
+    Returns the exit status, 1 if any benchmark regressed
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the game hot paths.")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME,
+                        help="seconds to run each benchmark for")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file")
+    parser.add_argument("--save-baseline", help="write the results as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="relative slowdown allowed before failing")
+    parser.add_argument("--no-isolate", action="store_true",
+                        help="run every benchmark in this process")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.filter, args.min_time, not args.no_isolate)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            baseline_file.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_results(results, baseline, args.tolerance)
+        for message in regressions:
+            sys.stderr.write("regression: %s\n" % message)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
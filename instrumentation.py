@@ -0,0 +1,239 @@
+"""
+Instrumentation for the game hot paths
+While the instrument context manager is active, the hot path functions
+of every game are swapped for wrappers that count and time each call.
+Outside it the original functions are in place, so there is no cost.
+
+with instrument() as recorder:
+    week3_tic_tac_toe.mc_move(board, player, trials)
+print recorder.to_prometheus()
+"""
+
+import contextlib
+import importlib
+import json
+import timeit
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.000001, 0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+
+# Functions wrapped by instrument, as (module, class or None, attribute,
+# kind).  Kind "call" times each call, "generator" times the whole
+# iteration, and "strategy" times the strategy passed to a simulator.
+HOOKS = [("week2_2048", None, "merge", "call"),
+         ("week2_2048", "TwentyFortyEight", "new_tile", "call"),
+         ("week3_tic_tac_toe", None, "mc_trial", "call"),
+         ("poc_ttt_provided", "TTTBoard", "check_win", "call"),
+         ("week3_tic_tac_toe", "BitboardTTTBoard", "check_win", "call"),
+         ("week4_yahtzee", None, "gen_all_sequences", "call"),
+         ("week4_yahtzee", None, "iter_all_sequences", "generator"),
+         ("week4_yahtzee", None, "score", "call"),
+         ("week5_cookie_clicker", None, "simulate_clicker", "strategy"),
+         ("week5_cookie_clicker", None, "simulate_clicker_fast", "strategy"),
+         ("week5_cookie_clicker", "ClickerState", "time_until", "call")]
+
+
+def hook_name(module_name, class_name, attribute):
+    """
+    Return the name a hooked function is recorded under.
+    """
+    if class_name is None:
+        return "%s.%s" % (module_name, attribute)
+    return "%s.%s.%s" % (module_name, class_name, attribute)
+
+
+class Recorder:
+    """
+    Call counts and latency histograms per instrumented function.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self._buckets = tuple(buckets)
+        self._counts = {}
+        self._totals = {}
+        self._histograms = {}
+
+    def record(self, name, seconds):
+        """
+        Record one call to name that took the given time.
+        """
+        if name not in self._counts:
+            self._counts[name] = 0
+            self._totals[name] = 0.0
+            self._histograms[name] = [0] * (len(self._buckets) + 1)
+        self._counts[name] += 1
+        self._totals[name] += seconds
+        histogram = self._histograms[name]
+        for index, bound in enumerate(self._buckets):
+            if seconds <= bound:
+                histogram[index] += 1
+                return
+        histogram[-1] += 1
+
+    def get_count(self, name):
+        """
+        Return the number of calls recorded for name.
+        """
+        return self._counts.get(name, 0)
+
+    def get_total(self, name):
+        """
+        Return the total seconds recorded for name.
+        """
+        return self._totals.get(name, 0.0)
+
+    def get_stats(self):
+        """
+        Return a dict of the count, total and mean seconds and the
+        cumulative histogram buckets of every recorded function.
+        """
+        stats = {}
+        for name in self._counts:
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(self._buckets + (float("inf"), ), self._histograms[name]):
+                cumulative += count
+                buckets.append((bound, cumulative))
+            stats[name] = {"count": self._counts[name],
+                           "total_seconds": self._totals[name],
+                           "mean_seconds": self._totals[name] / self._counts[name],
+                           "buckets": buckets}
+        return stats
+
+    def to_json(self):
+        """
+        Return the stats as JSON, with bucket bounds as strings.
+        """
+        stats = self.get_stats()
+        for entry in stats.values():
+            entry["buckets"] = dict([(_bound_label(bound), count)
+                                     for bound, count in entry["buckets"]])
+        return json.dumps({"functions": stats}, indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix="poc"):
+        """
+        Return the stats in the Prometheus text exposition format, as
+        one histogram labelled by function.
+        """
+        metric = prefix + "_call_seconds"
+        lines = ["# HELP %s Time spent in instrumented functions." % metric,
+                 "# TYPE %s histogram" % metric]
+        for name, entry in sorted(self.get_stats().items()):
+            for bound, count in entry["buckets"]:
+                lines.append('%s_bucket{function="%s",le="%s"} %d'
+                             % (metric, name, _bound_label(bound), count))
+            lines.append('%s_sum{function="%s"} %r' % (metric, name, entry["total_seconds"]))
+            lines.append('%s_count{function="%s"} %d' % (metric, name, entry["count"]))
+        return "\n".join(lines) + "\n"
+
+
+def _bound_label(bound):
+    """
+    Return a histogram bucket bound as Prometheus writes it.
+    """
+    if bound == float("inf"):
+        return "+Inf"
+    return repr(bound)
+
+
+def _wrap_call(func, name, recorder):
+    """
+    Return a wrapper of func that records the time of every call.
+    The wrapper's __wrapped__ is func, so code that looks functions up
+    by identity can find the original.
+    """
+    timer = timeit.default_timer
+
+    def wrapper(*args, **kwargs):
+        start = timer()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            recorder.record(name, timer() - start)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def _wrap_generator(func, name, recorder):
+    """
+    Return a wrapper of a generator function that records the time
+    spent producing all of the items of each call.
+    """
+    timer = timeit.default_timer
+
+    def wrapper(*args, **kwargs):
+        elapsed = 0.0
+        start = timer()
+        iterator = iter(func(*args, **kwargs))
+        try:
+            while True:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                elapsed += timer() - start
+                yield item
+                start = timer()
+        finally:
+            recorder.record(name, elapsed + timer() - start)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _wrap_simulator(func, name, recorder):
+    """
+    Return a wrapper of a Cookie Clicker simulator that records the
+    time of every call of the strategy it is given.  Simulators that
+    skip calls for particular strategies look them up through the
+    wrapped strategy's __wrapped__, so only real calls are recorded.
+    """
+    module_name = name.rsplit(".", 1)[0]
+
+    def wrapper(build_info, duration, strategy, *args, **kwargs):
+        strategy = _wrap_call(strategy, "%s.strategy.%s"
+                              % (module_name, strategy.__name__), recorder)
+        return func(build_info, duration, strategy, *args, **kwargs)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+@contextlib.contextmanager
+def instrument(names=None, recorder=None):
+    """
+    Instrument the functions in HOOKS, or only those whose recorded
+    name is in names, until the block ends.
+
+    Yields the Recorder that collects the results
+    """
+    if recorder is None:
+        recorder = Recorder()
+    patches = []
+    try:
+        for module_name, class_name, attribute, kind in HOOKS:
+            name = hook_name(module_name, class_name, attribute)
+            if names is not None and name not in names:
+                continue
+            module = importlib.import_module(module_name)
+            if class_name is None:
+                owner = module
+                original = getattr(module, attribute)
+            else:
+                owner = getattr(module, class_name)
+                original = owner.__dict__[attribute]
+
+            if kind == "generator":
+                wrapper = _wrap_generator(original, name, recorder)
+            elif kind == "strategy":
+                wrapper = _wrap_simulator(original, name, recorder)
+            else:
+                wrapper = _wrap_call(original, name, recorder)
+            setattr(owner, attribute, wrapper)
+            patches.append((owner, attribute, original))
+        yield recorder
+    finally:
+        for owner, attribute, original in reversed(patches):
+            setattr(owner, attribute, original)
@@ -0,0 +1,64 @@
+"""
+Cookie Clicker Simulator Build Information
+Local stand-in for the CodeSkulptor module of the same name, so the
+simulator can be imported and run outside the browser.
+"""
+
+BUILD_GROWTH = 1.15
+
+class BuildInfo:
+    """
+    Class to track build information.
+    """
+
+    def __init__(self, build_info = None, growth_factor = BUILD_GROWTH):
+        self._build_growth = growth_factor
+        if build_info == None:
+            self._info = {"Cursor": [15.0, 0.1],
+                          "Grandma": [100.0, 0.5],
+                          "Farm": [500.0, 4.0],
+                          "Factory": [3000.0, 10.0],
+                          "Mine": [10000.0, 40.0],
+                          "Shipment": [40000.0, 100.0],
+                          "Alchemy Lab": [200000.0, 400.0],
+                          "Portal": [1666666.0, 6666.0],
+                          "Time Machine": [123456789.0, 98765.0],
+                          "Antimatter Condenser": [3999999999.0, 999999.0]}
+        else:
+            self._info = {}
+            for key, value in build_info.items():
+                self._info[key] = list(value)
+
+    def build_items(self):
+        """
+        Get a list of buildable items
+        """
+        return self._info.keys()
+
+    def get_cost(self, item):
+        """
+        Get the current cost of an item
+        Will throw a KeyError exception if item is not in the build info.
+        """
+        return self._info[item][0]
+
+    def get_cps(self, item):
+        """
+        Get the current CPS of an item
+        Will throw a KeyError exception if item is not in the build info.
+        """
+        return self._info[item][1]
+
+    def update_item(self, item):
+        """
+        Update the cost of an item by the growth factor
+        Will throw a KeyError exception if item is not in the build info.
+        """
+        cost, cps = self._info[item]
+        self._info[item] = [cost * self._build_growth, cps]
+
+    def clone(self):
+        """
+        Return a clone of this BuildInfo
+        """
+        return BuildInfo(self._info, self._build_growth)
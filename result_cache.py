@@ -0,0 +1,245 @@
+"""
+Persistent result cache for the planners and simulations
+Results are stored in an SQLite file under a SHA-256 hash of their
+inputs, so every process that opens the same file shares them.  The
+least recently used results are evicted once the file holds more than
+a set number of bytes.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import random
+import sqlite3
+import time
+
+# Bump to invalidate every stored result when a cached computation changes
+CACHE_VERSION = 1
+
+# Default bound on the total size of the stored results
+MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds a process waits for another one's write to finish
+LOCK_TIMEOUT = 30.0
+
+# Seconds before a hit refreshes a result's last used time.  Eviction
+# does not need finer recency, and most hits then only read.
+TOUCH_INTERVAL = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def _canonical(value):
+    """
+    Convert a value to a structure of lists, strings and numbers that
+    serializes the same way in every process.  Functions stand for
+    their module and name, and dicts for their sorted items.
+    """
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, dict):
+        return [[_canonical(key), _canonical(item)] for key, item in sorted(value.items())]
+    if callable(value) and hasattr(value, "__name__"):
+        return "%s.%s" % (getattr(value, "__module__", None), value.__name__)
+    if isinstance(value, float):
+        return repr(value)
+    return value
+
+
+def stable_key(namespace, *parts):
+    """
+    Hash a namespace and input values into a cache key.
+
+    Returns a hex string
+    """
+    text = json.dumps([CACHE_VERSION, namespace, _canonical(parts)],
+                      sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def board_contents(board):
+    """
+    Return the dimension, reverse flag and squares of a Tic-Tac-Toe
+    board as a tuple for stable_key.
+    """
+    dim = board.get_dim()
+    squares = tuple([board.square(row, col) for row in range(dim) for col in range(dim)])
+    return (dim, getattr(board, "_reverse", False), squares)
+
+
+def build_info_contents(build_info):
+    """
+    Return the growth factor and the sorted (item, cost, cps) entries
+    of a BuildInfo as a tuple for stable_key.
+    """
+    items = sorted(build_info.build_items())
+    return (getattr(build_info, "_build_growth", None),
+            tuple([(item, build_info.get_cost(item), build_info.get_cps(item))
+                   for item in items]))
+
+
+class ResultCache:
+    """
+    Size-bounded store of pickled results in an SQLite file.  The file
+    is opened in write-ahead log mode, so readers in other processes
+    are not blocked by a writer.  Each process opens its own
+    connection, including processes forked after the cache was made.
+    """
+
+    def __init__(self, filename, max_bytes=MAX_BYTES):
+        self._filename = filename
+        self._max_bytes = max_bytes
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        """
+        Return the connection for this process, opening it if needed.
+        """
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self._filename, timeout=LOCK_TIMEOUT,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(_SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        """
+        Close this process's connection.
+        """
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def get(self, key, default=None):
+        """
+        Return the result stored under key, or default if there is none.
+        The last used time is only written when it is more than
+        TOUCH_INTERVAL seconds old, so most hits take no write lock.
+        """
+        connection = self._connect()
+        row = connection.execute("SELECT value, last_used FROM results WHERE key = ?",
+                                 (key, )).fetchone()
+        if row is None:
+            return default
+        now = time.time()
+        if now - row[1] > TOUCH_INTERVAL:
+            connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+        return pickle.loads(bytes(row[0]))
+
+    def put(self, key, value):
+        """
+        Store a result under key, then evict the least recently used
+        results until the total size is within the bound.  Results
+        larger than the bound on their own are not stored.
+        """
+        blob = pickle.dumps(value, 2)
+        if len(blob) > self._max_bytes:
+            return
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                               (key, sqlite3.Binary(blob), len(blob), time.time()))
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self._max_bytes:
+                rows = connection.execute("SELECT key, size FROM results ORDER BY last_used")
+                evicted = []
+                for old_key, size in rows:
+                    if total <= self._max_bytes:
+                        break
+                    evicted.append((old_key, ))
+                    total -= size
+                connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the result stored under key, calling compute and storing
+        its result if there is none.  Two processes that miss at once
+        both compute, and the later result is kept.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """
+        Remove every stored result.
+        """
+        self._connect().execute("DELETE FROM results")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get_size(self):
+        """
+        Return the total size in bytes of the stored results.
+        """
+        return self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+
+def cached_strategy(cache, hand, num_die_sides):
+    """
+    Return yahtzee.strategy(hand, num_die_sides), from the cache if
+    the same sorted hand has been planned before.  Holds are returned
+    as strategy gives them for the sorted hand.
+    """
+    import week4_yahtzee as yahtzee
+
+    hand = tuple(sorted(hand))
+    key = stable_key("yahtzee.strategy", hand, num_die_sides)
+    return cache.get_or_compute(key, lambda: yahtzee.strategy(hand, num_die_sides))
+
+
+def cached_mc_move(cache, board, player, trials, seed):
+    """
+    Return the move mc_move makes on board with the random module
+    seeded with seed, from the cache if possible.  The state of the
+    random module is left as it was.
+    """
+    import week3_tic_tac_toe as ttt
+
+    def compute():
+        state = random.getstate()
+        random.seed(seed)
+        try:
+            return ttt.mc_move(board, player, trials)
+        finally:
+            random.setstate(state)
+
+    key = stable_key("ttt.mc_move", board_contents(board), player, trials, seed)
+    return cache.get_or_compute(key, compute)
+
+
+def cached_simulate_clicker(cache, build_info, duration, strategy, simulator=None):
+    """
+    Return the ClickerState that simulator (simulate_clicker by
+    default) ends with, from the cache if possible.  Strategies are
+    identified by module and name, so only deterministic strategies
+    should be cached; strategy_lookahead is not if it is given a
+    DECISION_TIME_BUDGET.
+    """
+    import week5_cookie_clicker as clicker
+
+    if simulator is None:
+        simulator = clicker.simulate_clicker
+    key = stable_key("clicker.simulate", build_info_contents(build_info),
+                     duration, strategy, simulator)
+    return cache.get_or_compute(key, lambda: simulator(build_info, duration, strategy))
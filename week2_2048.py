@@ -2,8 +2,9 @@
 Clone of 2048 game.
 """
 
-import poc_2048_gui
 import random
+import time
+import collections
 
 # Directions, DO NOT MODIFY
 UP = 1
@@ -67,6 +68,12 @@ class TwentyFortyEight:
         initial tiles.
         """
         self._grid = [ [0 for dummy_col in range(self._width)] for dummy_row in range(self._height) ]
+
+        # Empty squares, plus the position of each one in the list, so
+        # a square can be added, removed or picked at random in O(1)
+        self._empty_cells = [(row, col) for row in range(self._height) for col in range(self._width)]
+        self._empty_index = dict([(cell, index) for index, cell in enumerate(self._empty_cells)])
+
         self.new_tile()
         self.new_tile()
         
@@ -97,6 +104,8 @@ class TwentyFortyEight:
         """
         Move all tiles in the given direction and add
         a new tile if any tiles moved.
+
+        Returns True if any tiles moved.
         """
         direction_tiles = self._move_dict[direction]
         offset = OFFSETS[direction]
@@ -106,6 +115,8 @@ class TwentyFortyEight:
         else:
             times = self._width
             
+        moved = False
+
         for current_tile in direction_tiles:
             tile = list(current_tile)
             temp_list = []
@@ -116,6 +127,9 @@ class TwentyFortyEight:
                 tile[1] += offset[1]
                 
             result = merge(temp_list)
+            if result == temp_list:
+                continue
+            moved = True
             tile = list(current_tile)
             
             for current_time in range(times):
@@ -123,7 +137,9 @@ class TwentyFortyEight:
                 tile[0] += offset[0]
                 tile[1] += offset[1]
         
-        self.new_tile()
+        if moved:
+            self.new_tile()
+        return moved
 
     def new_tile(self):
         """
@@ -131,26 +147,29 @@ class TwentyFortyEight:
         square.  The tile should be 2 90% of the time and
         4 10% of the time.
         """
-        selected = False
-        count = self._width * self._height
-        
-        while selected != True and count != 0:
-            row = random.randint(0, self._height-1)
-            col = random.randint(0, self._width-1)
-            
-            if self._grid[row][col] == 0:
-                probability_list = [2, 2, 2, 2, 2, 2, 2, 2, 2, 4]
-                self.set_tile(row, col, random.choice(probability_list))
-                selected = True
-                
-            count -= 1
+        if self._empty_cells:
+            row, col = random.choice(self._empty_cells)
+            probability_list = [2, 2, 2, 2, 2, 2, 2, 2, 2, 4]
+            self.set_tile(row, col, random.choice(probability_list))
 
     def set_tile(self, row, col, value):
         """
         Set the tile at position row, col to have the given value.
         """
+        was_empty = self._grid[row][col] == 0
         self._grid[row][col] = value
 
+        if was_empty and value != 0:
+            # Swap the last empty square into this one's slot
+            index = self._empty_index.pop((row, col))
+            last = self._empty_cells.pop()
+            if last != (row, col):
+                self._empty_cells[index] = last
+                self._empty_index[last] = index
+        elif not was_empty and value == 0:
+            self._empty_index[(row, col)] = len(self._empty_cells)
+            self._empty_cells.append((row, col))
+
     def get_tile(self, row, col):
         """
         Return the value of the tile at position row, col.
@@ -158,4 +177,514 @@ class TwentyFortyEight:
         return self._grid[row][col]
 
 
-poc_2048_gui.run_gui(TwentyFortyEight(4, 4))
+# Bitboard backend for the standard 4x4 game.  The board is packed into
+# a 64-bit integer holding one 4-bit log2 exponent per tile (0 for an
+# empty square).  Row r occupies bits 16*r .. 16*r+15 and column c is
+# nibble c within its row, so tiles above 32768 are not representable
+# and raise ValueError.
+BITBOARD_SIZE = 4
+ROW_MASK = 0xFFFF
+TILE_MASK = 0xF
+BOARD_MASK = (1 << 64) - 1
+
+# Table entry for a row whose merge makes a tile above 32768.  It lies
+# above the 64 board bits however far it is shifted, so bitboard_move
+# can spot it with one comparison.
+_OVERFLOW = 1 << 64
+
+# Lookup tables indexed by a packed 16-bit row, filled in on first use.
+# The column tables hold the same merged row spread down a column, so
+# an up or down move needs only a single transpose.
+_ROW_LEFT = []
+_ROW_RIGHT = []
+_COL_UP = []
+_COL_DOWN = []
+
+# Every packed row spread down column 0, so a board is transposed with
+# four lookups instead of a chain of 64-bit masks and shifts
+_ROW_SPREAD = []
+
+def _unpack_row(row):
+    """
+    Return the tile values of a packed 16-bit row as a list.
+    """
+    line = []
+    for col in range(BITBOARD_SIZE):
+        exponent = (row >> (4 * col)) & TILE_MASK
+        if exponent == 0:
+            line.append(0)
+        else:
+            line.append(1 << exponent)
+    return line
+
+def _pack_row(line):
+    """
+    Pack a list of tile values into a 16-bit row.
+    """
+    row = 0
+    for col in range(BITBOARD_SIZE):
+        row |= _value_to_exponent(line[col]) << (4 * col)
+    return row
+
+def _value_to_exponent(value):
+    """
+    Return the log2 exponent of a tile value, 0 for an empty tile.
+    Raises ValueError for values a packed tile cannot hold.
+    """
+    if value == 0:
+        return 0
+    exponent = value.bit_length() - 1
+    if value != 1 << exponent or not 0 < exponent <= TILE_MASK:
+        raise ValueError("tile value %r cannot be stored on a bitboard" % (value, ))
+    return exponent
+
+def init_bitboard_tables():
+    """
+    Precompute the left and right merge of every possible packed row.
+    The tables are built from merge itself, so the bitboard moves
+    always agree with TwentyFortyEight.  Rows that would merge two
+    32768 tiles get the _OVERFLOW entry.
+    """
+    if _ROW_LEFT:
+        return
+
+    for row in range(ROW_MASK + 1):
+        line = _unpack_row(row)
+        _add_table_row(_ROW_LEFT, _COL_UP, merge(line))
+        _add_table_row(_ROW_RIGHT, _COL_DOWN, merge(line[::-1])[::-1])
+        _ROW_SPREAD.append(_row_to_column(row))
+
+def _add_table_row(row_table, column_table, line):
+    """
+    Append a merged line to a row table and its column table, or
+    _OVERFLOW if the line holds a tile too big to pack.
+    """
+    try:
+        row = _pack_row(line)
+    except ValueError:
+        row_table.append(_OVERFLOW)
+        column_table.append(_OVERFLOW)
+        return
+    row_table.append(row)
+    column_table.append(_row_to_column(row))
+
+def _row_to_column(row):
+    """
+    Spread a packed 16-bit row down column 0 of a packed board.
+    """
+    column = 0
+    for index in range(BITBOARD_SIZE):
+        column |= ((row >> (4 * index)) & TILE_MASK) << (16 * index)
+    return column
+
+def _move_rows(board, table):
+    """
+    Apply a row lookup table to all four rows of a packed board.
+    """
+    return (table[board & ROW_MASK]
+            | table[(board >> 16) & ROW_MASK] << 16
+            | table[(board >> 32) & ROW_MASK] << 32
+            | table[(board >> 48) & ROW_MASK] << 48)
+
+def _move_columns(board, table):
+    """
+    Apply a column lookup table to all four columns of a packed board.
+    The board is transposed first, so each column becomes a row key.
+    """
+    board = (_ROW_SPREAD[board & ROW_MASK]
+             | _ROW_SPREAD[(board >> 16) & ROW_MASK] << 4
+             | _ROW_SPREAD[(board >> 32) & ROW_MASK] << 8
+             | _ROW_SPREAD[(board >> 48) & ROW_MASK] << 12)
+    return (table[board & ROW_MASK]
+            | table[(board >> 16) & ROW_MASK] << 4
+            | table[(board >> 32) & ROW_MASK] << 8
+            | table[(board >> 48) & ROW_MASK] << 12)
+
+def bitboard_move(board, direction):
+    """
+    Return the packed board that results from moving all tiles in
+    the given direction.  No new tile is added.  Raises ValueError if
+    the move would merge two 32768 tiles.
+    """
+    if direction == LEFT:
+        new_board = _move_rows(board, _ROW_LEFT)
+    elif direction == RIGHT:
+        new_board = _move_rows(board, _ROW_RIGHT)
+    elif direction == UP:
+        new_board = _move_columns(board, _COL_UP)
+    else:
+        new_board = _move_columns(board, _COL_DOWN)
+    if new_board > BOARD_MASK:
+        raise ValueError("move makes a tile above 32768, which a bitboard cannot hold")
+    return new_board
+
+def bitboard_moves(board):
+    """
+    Return the packed boards that result from moving all tiles UP,
+    DOWN, LEFT and RIGHT, as a list of (direction, board) pairs in
+    that order.  The rows are split out and the board transposed once
+    for all four moves.  Raises ValueError as bitboard_move does.
+    """
+    row0 = board & ROW_MASK
+    row1 = (board >> 16) & ROW_MASK
+    row2 = (board >> 32) & ROW_MASK
+    row3 = (board >> 48) & ROW_MASK
+    columns = (_ROW_SPREAD[row0] | _ROW_SPREAD[row1] << 4
+               | _ROW_SPREAD[row2] << 8 | _ROW_SPREAD[row3] << 12)
+    col0 = columns & ROW_MASK
+    col1 = (columns >> 16) & ROW_MASK
+    col2 = (columns >> 32) & ROW_MASK
+    col3 = (columns >> 48) & ROW_MASK
+    moves = [(UP, _COL_UP[col0] | _COL_UP[col1] << 4
+              | _COL_UP[col2] << 8 | _COL_UP[col3] << 12),
+             (DOWN, _COL_DOWN[col0] | _COL_DOWN[col1] << 4
+              | _COL_DOWN[col2] << 8 | _COL_DOWN[col3] << 12),
+             (LEFT, _ROW_LEFT[row0] | _ROW_LEFT[row1] << 16
+              | _ROW_LEFT[row2] << 32 | _ROW_LEFT[row3] << 48),
+             (RIGHT, _ROW_RIGHT[row0] | _ROW_RIGHT[row1] << 16
+              | _ROW_RIGHT[row2] << 32 | _ROW_RIGHT[row3] << 48)]
+    for dummy_direction, new_board in moves:
+        if new_board > BOARD_MASK:
+            raise ValueError("move makes a tile above 32768, which a bitboard cannot hold")
+    return moves
+
+def bitboard_empty_cells(board):
+    """
+    Return the list of (row, col) squares that are empty on a
+    packed board.
+    """
+    empty = []
+    for index in range(BITBOARD_SIZE * BITBOARD_SIZE):
+        if (board >> (4 * index)) & TILE_MASK == 0:
+            empty.append((index // BITBOARD_SIZE, index % BITBOARD_SIZE))
+    return empty
+
+class BitboardTwentyFortyEight:
+    """
+    Game logic for the 4x4 game on a packed 64-bit board.  Has the
+    same interface as TwentyFortyEight, so it can be passed to the GUI.
+    """
+
+    def __init__(self, grid_height=BITBOARD_SIZE, grid_width=BITBOARD_SIZE):
+        if grid_height != BITBOARD_SIZE or grid_width != BITBOARD_SIZE:
+            raise ValueError("the bitboard backend only supports 4x4 grids")
+        init_bitboard_tables()
+        self._height = grid_height
+        self._width = grid_width
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the game so the grid is empty except for two
+        initial tiles.
+        """
+        self._board = 0
+        self.new_tile()
+        self.new_tile()
+
+    def __str__(self):
+        """
+        Return a string representation of the grid for debugging.
+        """
+        grid = [_unpack_row((self._board >> (16 * row)) & ROW_MASK)
+                for row in range(self._height)]
+        return str(grid)
+
+    def get_grid_height(self):
+        """
+        Get the height of the board.
+        """
+        return self._height
+
+    def get_grid_width(self):
+        """
+        Get the width of the board.
+        """
+        return self._width
+
+    def get_board(self):
+        """
+        Return the packed 64-bit board.
+        """
+        return self._board
+
+    def set_board(self, board):
+        """
+        Replace the packed 64-bit board.
+        """
+        self._board = board
+
+    def move(self, direction):
+        """
+        Move all tiles in the given direction and add
+        a new tile if any tiles moved.
+
+        Returns True if any tiles moved.
+        """
+        new_board = bitboard_move(self._board, direction)
+        if new_board == self._board:
+            return False
+        self._board = new_board
+        self.new_tile()
+        return True
+
+    def new_tile(self):
+        """
+        Create a new tile in a randomly selected empty
+        square.  The tile should be 2 90% of the time and
+        4 10% of the time.
+        """
+        empty = bitboard_empty_cells(self._board)
+        if empty:
+            row, col = random.choice(empty)
+            probability_list = [2, 2, 2, 2, 2, 2, 2, 2, 2, 4]
+            self.set_tile(row, col, random.choice(probability_list))
+
+    def set_tile(self, row, col, value):
+        """
+        Set the tile at position row, col to have the given value.
+        Raises ValueError for values above 32768 or not a power of two.
+        """
+        shift = 4 * (row * BITBOARD_SIZE + col)
+        exponent = _value_to_exponent(value)
+        self._board = (self._board & ~(TILE_MASK << shift)) | (exponent << shift)
+
+    def get_tile(self, row, col):
+        """
+        Return the value of the tile at position row, col.
+        """
+        exponent = (self._board >> (4 * (row * BITBOARD_SIZE + col))) & TILE_MASK
+        if exponent == 0:
+            return 0
+        return 1 << exponent
+
+
+# Expectimax solver.  Move nodes take the best of the four directions,
+# chance nodes average over every empty square receiving a 2 or a 4
+# with the same odds as new_tile.
+SPAWN_PROBABILITIES = ((2, 0.9), (4, 0.1))
+
+# Weights for the per-row board heuristic.  Row scores are shifted so
+# the worst row scores 0, so every live board scores at least 0 and a
+# lost board, at -LOST_PENALTY, is always strictly worst.
+EMPTY_WEIGHT = 270.0
+MERGE_WEIGHT = 700.0
+MONOTONIC_WEIGHT = 47.0
+SUM_WEIGHT = 11.0
+LOST_PENALTY = 200000.0
+
+# Heuristic score of every packed row, filled in on first use
+_ROW_SCORE = []
+
+def _transpose(board):
+    """
+    Transpose a packed board, turning columns into rows.
+    """
+    part1 = board & 0xF0F00F0FF0F00F0F
+    part2 = board & 0x0000F0F00000F0F0
+    part3 = board & 0x0F0F00000F0F0000
+    board = part1 | (part2 << 12) | (part3 >> 12)
+    part1 = board & 0xFF00FF0000FF00FF
+    part2 = board & 0x00FF00FF00000000
+    part3 = board & 0x00000000FF00FF00
+    return part1 | (part2 >> 24) | (part3 << 24)
+
+def _init_score_table():
+    """
+    Precompute the heuristic score of every possible packed row.
+    Rows score well when they have empty squares, adjacent equal
+    tiles and values that are monotonic along the row.
+    """
+    if _ROW_SCORE:
+        return
+
+    scores = []
+    for row in range(ROW_MASK + 1):
+        ranks = [(row >> (4 * col)) & TILE_MASK for col in range(BITBOARD_SIZE)]
+        empty = ranks.count(0)
+        merges = 0
+        for col in range(BITBOARD_SIZE - 1):
+            if ranks[col] != 0 and ranks[col] == ranks[col + 1]:
+                merges += 1
+        mono_left = 0
+        mono_right = 0
+        for col in range(BITBOARD_SIZE - 1):
+            if ranks[col] > ranks[col + 1]:
+                mono_left += ranks[col] ** 4 - ranks[col + 1] ** 4
+            else:
+                mono_right += ranks[col + 1] ** 4 - ranks[col] ** 4
+        rank_sum = sum([rank ** 3.5 for rank in ranks])
+        scores.append(EMPTY_WEIGHT * empty + MERGE_WEIGHT * merges
+                      - MONOTONIC_WEIGHT * min(mono_left, mono_right)
+                      - SUM_WEIGHT * rank_sum)
+
+    worst = min(scores)
+    _ROW_SCORE.extend([score - worst for score in scores])
+    assert -LOST_PENALTY < 2 * BITBOARD_SIZE * min(_ROW_SCORE)
+
+def bitboard_score(board):
+    """
+    Return the heuristic score of a packed board, summed over its
+    rows and its columns.
+    """
+    columns = _transpose(board)
+    total = 0.0
+    for shift in (0, 16, 32, 48):
+        total += _ROW_SCORE[(board >> shift) & ROW_MASK]
+        total += _ROW_SCORE[(columns >> shift) & ROW_MASK]
+    return total
+
+def game_to_bitboard(game):
+    """
+    Pack the grid of a 4x4 TwentyFortyEight-compatible game into a
+    64-bit board.
+    """
+    if game.get_grid_height() != BITBOARD_SIZE or game.get_grid_width() != BITBOARD_SIZE:
+        raise ValueError("the expectimax solver only supports 4x4 grids")
+
+    board = 0
+    for row in range(BITBOARD_SIZE):
+        for col in range(BITBOARD_SIZE):
+            exponent = _value_to_exponent(game.get_tile(row, col))
+            board |= exponent << (4 * (row * BITBOARD_SIZE + col))
+    return board
+
+class _SearchTimeout(Exception):
+    """
+    Raised inside the search when the time budget runs out.
+    """
+    pass
+
+class ExpectimaxSolver:
+    """
+    Expectimax player for 4x4 games.  Works with any object that has
+    the TwentyFortyEight interface.
+    """
+
+    def __init__(self, max_depth=3, min_probability=0.0001, cache_size=100000):
+        init_bitboard_tables()
+        _init_score_table()
+        self._max_depth = max_depth
+        self._min_probability = min_probability
+        self._cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._deadline = None
+
+    def clear_cache(self):
+        """
+        Empty the transposition table.
+        """
+        self._cache.clear()
+
+    def best_move(self, game, depth=None):
+        """
+        Return the direction with the highest expected score after
+        searching depth moves ahead, or None if no move changes the
+        board.
+        """
+        if depth is None:
+            depth = self._max_depth
+        self._deadline = None
+        return self._search_root(game_to_bitboard(game), depth)
+
+    def best_move_within(self, game, time_limit_ms):
+        """
+        Return the best direction found within time_limit_ms
+        milliseconds, deepening the search one level at a time up to
+        the maximum depth.  Returns None if no move changes the board.
+        """
+        board = game_to_bitboard(game)
+        self._deadline = time.time() + time_limit_ms / 1000.0
+
+        best = None
+        for move, new_board in bitboard_moves(board):
+            if new_board != board:
+                best = move
+                break
+
+        try:
+            for depth in range(1, self._max_depth + 1):
+                best = self._search_root(board, depth)
+        except _SearchTimeout:
+            pass
+
+        self._deadline = None
+        return best
+
+    def _search_root(self, board, depth):
+        """
+        Return the best direction from board at the given depth.
+        """
+        best_move = None
+        best_value = None
+        for move, new_board in bitboard_moves(board):
+            if new_board == board:
+                continue
+            value = self._chance_node(new_board, depth, 1.0)
+            if best_move is None or value > best_value:
+                best_move = move
+                best_value = value
+        return best_move
+
+    def _move_node(self, board, depth, probability):
+        """
+        Return the value of board with the player to move.
+        """
+        if depth == 0 or probability < self._min_probability:
+            return bitboard_score(board)
+
+        if self._deadline is not None and time.time() > self._deadline:
+            raise _SearchTimeout()
+
+        cached = self._cache.get(board)
+        if cached is not None and cached[0] >= depth:
+            del self._cache[board]
+            self._cache[board] = cached
+            return cached[1]
+
+        best_value = -LOST_PENALTY
+        for dummy_move, new_board in bitboard_moves(board):
+            if new_board != board:
+                best_value = max(best_value,
+                                 self._chance_node(new_board, depth, probability))
+
+        self._cache[board] = (depth, best_value)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return best_value
+
+    def _chance_node(self, board, depth, probability):
+        """
+        Return the expected value of board over all tile spawns.
+        """
+        empty = [index for index in range(BITBOARD_SIZE * BITBOARD_SIZE)
+                 if (board >> (4 * index)) & TILE_MASK == 0]
+        if not empty:
+            return self._move_node(board, depth - 1, probability)
+
+        total = 0.0
+        for index in empty:
+            shift = 4 * index
+            for value, odds in SPAWN_PROBABILITIES:
+                spawned = board | (_value_to_exponent(value) << shift)
+                total += odds * self._move_node(spawned, depth - 1,
+                                                probability * odds / len(empty))
+        return total / len(empty)
+
+
+def main(argv=None):
+    """
+    Start the GUI from the command line.
+    """
+    import argparse
+    import poc_2048_gui
+
+    parser = argparse.ArgumentParser(description="Play 2048 in the GUI.")
+    parser.add_argument("--height", type=int, default=4, help="rows on the board")
+    parser.add_argument("--width", type=int, default=4, help="columns on the board")
+    args = parser.parse_args(argv)
+    poc_2048_gui.run_gui(TwentyFortyEight(args.height, args.width))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Batched 2048 game logic.  Runs many games at once on a single NumPy
+array, for rollout studies that would be too slow one
+TwentyFortyEight object at a time.
+"""
+
+import numpy
+from week2_2048 import UP, DOWN, LEFT, RIGHT
+
+# Probability that a new tile is a 4 rather than a 2
+FOUR_PROBABILITY = 0.1
+
+def _compact(lines):
+    """
+    Slide the non-zero tiles of every line to the front, keeping
+    their order.
+    """
+    order = numpy.argsort(lines == 0, axis=1, kind='mergesort')
+    rows = numpy.arange(lines.shape[0])[:, numpy.newaxis]
+    return lines[rows, order]
+
+def merge_lines(lines):
+    """
+    Merge every row of a 2-D array towards index 0.  Gives the same
+    result as merge applied to each row on its own.
+    """
+    lines = _compact(lines)
+    for index in range(lines.shape[1] - 1):
+        first = lines[:, index]
+        second = lines[:, index + 1]
+        equal = (first == second) & (first != 0)
+        first[equal] *= 2
+        second[equal] = 0
+    return _compact(lines)
+
+class BatchTwentyFortyEight:
+    """
+    Class to run the game logic for many games of the same size at
+    once.  The boards are stored as one array of shape
+    (num_boards, grid_height, grid_width).
+    """
+
+    def __init__(self, num_boards, grid_height, grid_width, seed=None):
+        self._num_boards = num_boards
+        self._height = grid_height
+        self._width = grid_width
+        self._random = numpy.random.RandomState(seed)
+        self.reset()
+
+    def reset(self):
+        """
+        Reset every game so the grid is empty except for two
+        initial tiles.
+        """
+        self._grid = numpy.zeros((self._num_boards, self._height, self._width),
+                                 dtype=numpy.int64)
+        self.new_tile()
+        self.new_tile()
+
+    def get_num_boards(self):
+        """
+        Get the number of games in the batch.
+        """
+        return self._num_boards
+
+    def get_grid_height(self):
+        """
+        Get the height of the boards.
+        """
+        return self._height
+
+    def get_grid_width(self):
+        """
+        Get the width of the boards.
+        """
+        return self._width
+
+    def get_grids(self):
+        """
+        Return the array of all boards.  The array is shared with the
+        batch, so changes to it change the games.
+        """
+        return self._grid
+
+    def get_tile(self, board, row, col):
+        """
+        Return the value of the tile at position row, col of the
+        given board.
+        """
+        return int(self._grid[board, row, col])
+
+    def set_tile(self, board, row, col, value):
+        """
+        Set the tile at position row, col of the given board to have
+        the given value.
+        """
+        self._grid[board, row, col] = value
+
+    def _oriented(self, grid, direction):
+        """
+        Return a view of grid whose last axis runs in the direction
+        tiles move, so merging towards index 0 applies the move.
+        """
+        if direction == UP:
+            return grid.transpose(0, 2, 1)
+        elif direction == DOWN:
+            return grid.transpose(0, 2, 1)[:, :, ::-1]
+        elif direction == LEFT:
+            return grid
+        else:
+            return grid[:, :, ::-1]
+
+    def move(self, direction, spawn=True):
+        """
+        Move all tiles of every board in the given direction and,
+        if spawn is true, add a new tile to the boards where any
+        tiles moved.  Returns a boolean array of the boards that
+        changed.
+        """
+        old_grid = self._grid
+        lines = self._oriented(old_grid, direction)
+        shape = lines.shape
+        merged = merge_lines(lines.reshape(-1, shape[2])).reshape(shape)
+
+        new_grid = numpy.empty_like(old_grid)
+        self._oriented(new_grid, direction)[...] = merged
+        self._grid = new_grid
+
+        changed = (new_grid != old_grid).reshape(self._num_boards, -1).any(axis=1)
+        if spawn:
+            self.new_tile(changed)
+        return changed
+
+    def new_tile(self, mask=None):
+        """
+        Create a new tile in a randomly selected empty square of
+        every board, or only of the boards where mask is true.  The
+        tile should be 2 90% of the time and 4 10% of the time.
+        """
+        flat = self._grid.reshape(self._num_boards, -1)
+        empty = flat == 0
+        counts = empty.sum(axis=1)
+        selected = counts > 0
+        if mask is not None:
+            selected &= mask
+
+        choice = (self._random.random_sample(self._num_boards) * counts).astype(numpy.int64)
+        position = (numpy.cumsum(empty, axis=1) > choice[:, numpy.newaxis]).argmax(axis=1)
+        values = numpy.where(self._random.random_sample(self._num_boards)
+                             < FOUR_PROBABILITY, 4, 2)
+
+        boards = numpy.nonzero(selected)[0]
+        flat[boards, position[boards]] = values[boards]
+
+    def game_over(self):
+        """
+        Return a boolean array of the boards that have no empty
+        squares and no tiles that can merge.
+        """
+        grid = self._grid
+        full = (grid != 0).reshape(self._num_boards, -1).all(axis=1)
+        across = (grid[:, :, 1:] == grid[:, :, :-1]).reshape(self._num_boards, -1).any(axis=1)
+        down = (grid[:, 1:, :] == grid[:, :-1, :]).reshape(self._num_boards, -1).any(axis=1)
+        return full & ~across & ~down
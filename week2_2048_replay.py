@@ -0,0 +1,328 @@
+"""
+Flat-array 2048 engine with replay logs
+Boards of any size are kept in one flat list, with the cell indices of
+every line in each direction worked out once per board shape.  Spawns
+follow a configurable distribution and lines merge by a pluggable rule.
+Every game can be written to a compact binary log of moves and spawns,
+which replays without any randomness.
+"""
+
+import random
+import struct
+import week2_2048 as twenty
+from week2_2048 import UP, DOWN, LEFT, RIGHT
+
+# Merged lines remembered per rule before the memo is emptied
+MERGE_CACHE_SIZE = 100000
+
+# Log layout: a header, then a stream of records that each start with a
+# tag byte.  Tags 1-4 are moves in that direction and carry nothing
+# else; a spawn carries the cell index and value; a new game carries
+# the board height and width.
+_HEADER = struct.Struct("<4sH")
+_MAGIC = b"R2K8"
+_VERSION = 1
+SPAWN_TAG = 0
+NEW_GAME_TAG = 5
+_SPAWN = struct.Struct("<HI")
+_NEW_GAME = struct.Struct("<HH")
+_PAYLOAD_SIZES = {SPAWN_TAG: _SPAWN.size, NEW_GAME_TAG: _NEW_GAME.size}
+
+# Bytes read from a log at a time while replaying
+READ_SIZE = 1 << 16
+
+_STRIPES = {}
+_MERGE_CACHES = {}
+
+
+def direction_stripes(height, width):
+    """
+    Return a dict from each direction to the lines of a flat board of
+    the given shape, each a tuple of cell indices starting from the
+    edge the tiles move towards.  Computed once per shape.
+    """
+    shape = (height, width)
+    if shape not in _STRIPES:
+        columns = [tuple([row * width + col for row in range(height)]) for col in range(width)]
+        rows = [tuple([row * width + col for col in range(width)]) for row in range(height)]
+        _STRIPES[shape] = {UP: columns,
+                           DOWN: [column[::-1] for column in columns],
+                           LEFT: rows,
+                           RIGHT: [row[::-1] for row in rows]}
+    return _STRIPES[shape]
+
+
+def _merge_cache(merge_rule):
+    """
+    Return the memo of merged lines for a merge rule.
+    """
+    if merge_rule not in _MERGE_CACHES:
+        _MERGE_CACHES[merge_rule] = {}
+    return _MERGE_CACHES[merge_rule]
+
+
+def _move_cells(cells, stripes, merge_rule, cache):
+    """
+    Merge every line of a flat board along stripes, in place.
+
+    Returns True if any tile moved
+    """
+    moved = False
+    for stripe in stripes:
+        line = tuple([cells[index] for index in stripe])
+        result = cache.get(line)
+        if result is None:
+            result = tuple(merge_rule(list(line)))
+            if len(cache) >= MERGE_CACHE_SIZE:
+                cache.clear()
+            cache[line] = result
+        if result != line:
+            moved = True
+            for index, value in zip(stripe, result):
+                cells[index] = value
+    return moved
+
+
+class FlatTwentyFortyEight:
+    """
+    2048 game on a flat list of cells, with the same interface as
+    TwentyFortyEight.  spawn_distribution is a sequence of (value,
+    probability) pairs, merge_rule merges one line towards its start
+    like merge, and moves and spawns are written to log if one is given.
+    """
+
+    def __init__(self, grid_height, grid_width, spawn_distribution=twenty.SPAWN_PROBABILITIES,
+                 merge_rule=twenty.merge, rng=random, log=None):
+        self._height = grid_height
+        self._width = grid_width
+        self._stripes = direction_stripes(grid_height, grid_width)
+        self._merge_rule = merge_rule
+        self._merge_cache = _merge_cache(merge_rule)
+        self._rng = rng
+        self._log = log
+
+        total = 0.0
+        self._spawn_values = []
+        self._spawn_bounds = []
+        for value, probability in spawn_distribution:
+            total += probability
+            self._spawn_values.append(value)
+            self._spawn_bounds.append(total)
+        self._spawn_bounds = [bound / total for bound in self._spawn_bounds]
+
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the game so the grid is empty except for two
+        initial tiles.
+        """
+        self._cells = [0] * (self._height * self._width)
+        if self._log is not None:
+            self._log.new_game(self._height, self._width)
+        self.new_tile()
+        self.new_tile()
+
+    def __str__(self):
+        """
+        Return a string representation of the grid for debugging.
+        """
+        return "\n".join([str(self._cells[row * self._width:(row + 1) * self._width])
+                          for row in range(self._height)])
+
+    def get_grid_height(self):
+        """
+        Get the height of the board.
+        """
+        return self._height
+
+    def get_grid_width(self):
+        """
+        Get the width of the board.
+        """
+        return self._width
+
+    def get_cells(self):
+        """
+        Return a copy of the flat list of cells, row by row.
+        """
+        return list(self._cells)
+
+    def move(self, direction):
+        """
+        Move all tiles in the given direction and add
+        a new tile if any tiles moved.
+
+        Returns True if any tiles moved.
+        """
+        if self._log is not None:
+            self._log.move(direction)
+        moved = _move_cells(self._cells, self._stripes[direction],
+                            self._merge_rule, self._merge_cache)
+        if moved:
+            self.new_tile()
+        return moved
+
+    def new_tile(self):
+        """
+        Create a new tile in a randomly selected empty square, with a
+        value drawn from the spawn distribution.
+        """
+        empty = [index for index, value in enumerate(self._cells) if value == 0]
+        if not empty:
+            return
+        index = self._rng.choice(empty)
+        draw = self._rng.random()
+        value = self._spawn_values[-1]
+        for spawn_value, bound in zip(self._spawn_values, self._spawn_bounds):
+            if draw < bound:
+                value = spawn_value
+                break
+        self._cells[index] = value
+        if self._log is not None:
+            self._log.spawn(index, value)
+
+    def set_tile(self, row, col, value):
+        """
+        Set the tile at position row, col to have the given value.
+        """
+        self._cells[row * self._width + col] = value
+
+    def get_tile(self, row, col):
+        """
+        Return the value of the tile at position row, col.
+        """
+        return self._cells[row * self._width + col]
+
+
+class ReplayWriter:
+    """
+    Writes a replay log to a binary stream.  Records are buffered and
+    written out every flush_every bytes, and on flush and close.
+    """
+
+    def __init__(self, stream, flush_every=READ_SIZE):
+        self._stream = stream
+        self._flush_every = flush_every
+        self._buffer = bytearray(_HEADER.pack(_MAGIC, _VERSION))
+
+    def new_game(self, height, width):
+        """
+        Start a new game on a board of the given shape.
+        """
+        self._buffer.append(NEW_GAME_TAG)
+        self._buffer.extend(_NEW_GAME.pack(height, width))
+        self._check_flush()
+
+    def move(self, direction):
+        """
+        Record a move in the given direction.
+        """
+        self._buffer.append(direction)
+        self._check_flush()
+
+    def spawn(self, index, value):
+        """
+        Record a tile of the given value appearing at a flat cell index.
+        """
+        self._buffer.append(SPAWN_TAG)
+        self._buffer.extend(_SPAWN.pack(index, value))
+        self._check_flush()
+
+    def _check_flush(self):
+        """
+        Write out the buffer once it is big enough.
+        """
+        if len(self._buffer) >= self._flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Write out every buffered record.
+        """
+        self._stream.write(bytes(self._buffer))
+        self._buffer = bytearray()
+        self._stream.flush()
+
+    def close(self):
+        """
+        Flush the buffer and close the stream.
+        """
+        self.flush()
+        self._stream.close()
+
+
+def read_events(stream):
+    """
+    Read a replay log from a binary stream a block at a time.
+
+    Yields (NEW_GAME_TAG, height, width), (SPAWN_TAG, index, value)
+    and (direction, None, None) tuples in order
+    """
+    data = stream.read(_HEADER.size)
+    if len(data) < _HEADER.size:
+        raise ValueError("not a 2048 replay log")
+    magic, version = _HEADER.unpack(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("not a 2048 replay log")
+
+    data = bytearray()
+    offset = 0
+    while True:
+        block = stream.read(READ_SIZE)
+        data = data[offset:] + bytearray(block)
+        offset = 0
+        if not data:
+            return
+        # Stop short of the end so the last record of a block is
+        # completed by the next one
+        end = len(data) if not block else len(data) - max(_PAYLOAD_SIZES.values())
+        while offset < end:
+            tag = data[offset]
+            offset += 1
+            if offset + _PAYLOAD_SIZES.get(tag, 0) > len(data):
+                raise ValueError("truncated 2048 replay log")
+            if tag == SPAWN_TAG:
+                index, value = _SPAWN.unpack_from(data, offset)
+                offset += _SPAWN.size
+                yield SPAWN_TAG, index, value
+            elif tag == NEW_GAME_TAG:
+                height, width = _NEW_GAME.unpack_from(data, offset)
+                offset += _NEW_GAME.size
+                yield NEW_GAME_TAG, height, width
+            elif UP <= tag <= RIGHT:
+                yield tag, None, None
+            else:
+                raise ValueError("corrupt 2048 replay log")
+        if not block:
+            return
+
+
+def replay(stream, merge_rule=twenty.merge):
+    """
+    Replay every game in a log, merging lines with merge_rule, which
+    must be the rule the games were played with.
+
+    Yields the final flat list of cells and the shape of each game
+    """
+    cache = _merge_cache(merge_rule)
+    cells = None
+    shape = None
+    stripes = None
+    for tag, first, second in read_events(stream):
+        if cells is None and tag != NEW_GAME_TAG:
+            raise ValueError("corrupt 2048 replay log: no game started")
+        if tag == SPAWN_TAG:
+            if cells[first] != 0:
+                raise ValueError("corrupt 2048 replay log: spawn on a full cell")
+            cells[first] = second
+        elif tag == NEW_GAME_TAG:
+            if cells is not None:
+                yield cells, shape
+            shape = (first, second)
+            cells = [0] * (first * second)
+            stripes = direction_stripes(first, second)
+        else:
+            _move_cells(cells, stripes[tag], merge_rule, cache)
+    if cells is not None:
+        yield cells, shape
@@ -2,8 +2,9 @@
 Monte Carlo Tic-Tac-Toe Player
 """
 
+import math
 import random
-import poc_ttt_gui
+import time
 import poc_ttt_provided as provided
 
 # Constants for Monte Carlo simulator
@@ -12,16 +13,20 @@ import poc_ttt_provided as provided
 NTRIALS = 100         # Number of trials to run
 SCORE_CURRENT = 1.0 # Score for squares played by the current player
 SCORE_OTHER = 1.0   # Score for squares played by the other player
+TRIAL_CHUNKS = 64   # Number of seeded chunks trials are split into for mc_move_parallel
+REPORT_EVERY = 50   # Trials between progress reports from mc_move_stream
+SETTLED_CONFIDENCE = 0.99 # Confidence in the leading move at which mc_move_stream stops early
+MIN_SETTLED_TRIALS = 200 # Trials mc_move_stream runs before it may stop early
 # Add your functions here.
 
-def mc_trial(board, player):
+def mc_trial(board, player, rng=random):
     """
     This function takes a current board and the next player to move. The function should play a game starting with the given player by making random moves, alternating between players. The function should return when the game is over. The modified board will contain the state of the game, so the function does not return anything. In other words, the function should modify the board input.
     """
 
     while board.check_win() == None:
         empty = board.get_empty_squares()
-        choice = random.choice(empty)
+        choice = rng.choice(empty)
         board.move(choice[0], choice[1], player)
         player = provided.switch_player(player)
 
@@ -86,10 +91,342 @@ def mc_move(board, player, trials):
 
     return get_best_move(board, scores)
 
+def mc_chunk_scores(board, player, trials, seed):
+    """
+    This function runs the given number of trials from board with a random number generator seeded with seed, and returns the resulting grid of scores. Chunks with the same arguments always return the same scores, wherever they run.
+    """
+
+    rng = random.Random(seed)
+    scores = [ [0 for dummy_row in range(0, board.get_dim())] for dummy_col in range(0, board.get_dim()) ]
+    for dummy_trial in range(0, trials):
+
+        trial_board = board.clone()
+        mc_trial(trial_board, player, rng)
+        mc_update_scores(scores, trial_board, player)
+
+    return scores
+
+def _mc_chunk_worker(args):
+    """
+    Unpack the arguments of mc_chunk_scores for Pool.map.
+    """
+    return mc_chunk_scores(*args)
+
+def mc_move_parallel(board, player, trials, seed=0, processes=None, pool=None):
+    """
+    This function works like mc_move, but splits the trials into TRIAL_CHUNKS chunks, each with its own random number generator derived from seed, and runs them across a process pool. The chunk score grids are summed in chunk order, so for a fixed seed the move does not depend on the number of processes. processes=1 runs the chunks serially in this process; an existing multiprocessing pool can be passed in to avoid starting a new one on every move.
+    """
+
+    num_chunks = max(1, min(TRIAL_CHUNKS, trials))
+    chunks = []
+    for index in range(0, num_chunks):
+        chunk_trials = trials // num_chunks
+        if index < trials % num_chunks:
+            chunk_trials += 1
+        chunks.append((board, player, chunk_trials, seed * 1000003 + index))
+
+    if pool is not None:
+        chunk_scores = pool.map(_mc_chunk_worker, chunks)
+    elif processes == 1:
+        chunk_scores = [_mc_chunk_worker(chunk) for chunk in chunks]
+    else:
+        import multiprocessing
+        new_pool = multiprocessing.Pool(processes)
+        try:
+            chunk_scores = new_pool.map(_mc_chunk_worker, chunks)
+        finally:
+            new_pool.close()
+            new_pool.join()
+
+    scores = [ [0 for dummy_row in range(0, board.get_dim())] for dummy_col in range(0, board.get_dim()) ]
+    for grid in chunk_scores:
+        for row in range(0, board.get_dim()):
+            for col in range(0, board.get_dim()):
+                scores[row][col] += grid[row][col]
+
+    return get_best_move(board, scores)
+
+def mc_lead_confidence(board, scores, cross_scores, trials):
+    """
+    This function takes a current board, the grid of scores after the given number of trials and the grid of summed products of per-trial scores, where cross_scores[first][second] is indexed by the flat square numbers row * dim + col. It returns the move get_best_move would pick and the confidence, between 0.0 and 1.0, that its mean per-trial score is really ahead of every other empty square. Each difference of means gets a normal approximation with its variance taken from the per-trial differences, so squares whose scores move together are compared fairly, and the chances of being behind each square are added up.
+    """
+
+    best_move = get_best_move(board, scores)
+    if best_move == None or trials < 2:
+        return best_move, 0.0
+
+    dim = board.get_dim()
+    best = best_move[0] * dim + best_move[1]
+    best_mean = scores[best_move[0]][best_move[1]] * 1.0 / trials
+    doubt = 0.0
+    for square in board.get_empty_squares():
+        other = square[0] * dim + square[1]
+        if other == best:
+            continue
+        lead = best_mean - scores[square[0]][square[1]] * 1.0 / trials
+        squared_difference = cross_scores[best][best] - 2 * cross_scores[best][other] + cross_scores[other][other]
+        variance = (squared_difference * 1.0 / trials - lead * lead) / (trials - 1)
+        if variance <= 0.0:
+            if lead <= 0.0:
+                doubt += 0.5
+        else:
+            doubt += 0.5 * math.erfc(lead / math.sqrt(2.0 * variance))
+
+    return best_move, max(0.0, 1.0 - doubt)
+
+def mc_move_stream(board, player, time_limit, max_trials=None, confidence=SETTLED_CONFIDENCE, report_every=REPORT_EVERY):
+    """
+    This function is an anytime version of mc_move. It runs trials until time_limit seconds have passed, max_trials trials have run, or at least MIN_SETTLED_TRIALS trials have run and the leading move is ahead of every other move with the given confidence. Every report_every trials, and once at the end, it yields a (move, confidence, trials) tuple for the current best move. As the lead is tested again at every report, the k-th test only stops early if the chance of the wrong move leading is below (1 - confidence) / (k * (k + 1)); these add up to at most 1 - confidence over all the tests. If the board has no empty squares there is no move to make, and it yields nothing.
+    """
+
+    deadline = time.time() + time_limit
+    dim = board.get_dim()
+    empty = [row * dim + col for row, col in board.get_empty_squares()]
+    if not empty:
+        return
+    scores = [ [0 for dummy_row in range(0, dim)] for dummy_col in range(0, dim) ]
+    cross_scores = [ [0 for dummy_row in range(0, dim * dim)] for dummy_col in range(0, dim * dim) ]
+    trials = 0
+    tests = 0
+
+    while True:
+        trial_board = board.clone()
+        mc_trial(trial_board, player)
+        trial_scores = [ [0 for dummy_row in range(0, dim)] for dummy_col in range(0, dim) ]
+        mc_update_scores(trial_scores, trial_board, player)
+        for row in range(0, dim):
+            for col in range(0, dim):
+                scores[row][col] += trial_scores[row][col]
+        for first in empty:
+            first_score = trial_scores[first // dim][first % dim]
+            if first_score:
+                for second in empty:
+                    cross_scores[first][second] += first_score * trial_scores[second // dim][second % dim]
+        trials += 1
+
+        finished = time.time() > deadline or trials == max_trials
+        if finished or trials % report_every == 0:
+            move, move_confidence = mc_lead_confidence(board, scores, cross_scores, trials)
+            yield move, move_confidence, trials
+            if finished:
+                return
+            if trials >= MIN_SETTLED_TRIALS:
+                tests += 1
+                if 1.0 - move_confidence <= (1.0 - confidence) / (tests * (tests + 1)):
+                    return
+
+def mc_move_anytime(board, player, time_limit, max_trials=None, confidence=SETTLED_CONFIDENCE):
+    """
+    This function runs mc_move_stream to the end and returns the final move for the machine player in the form of a (row, column) tuple, or None at once if the board has no empty squares.
+    """
+
+    move = None
+    for move, dummy_confidence, dummy_trials in mc_move_stream(board, player, time_limit, max_trials, confidence):
+        pass
+    return move
+
+def is_reversed(board):
+    """
+    This function takes any board with the provided.TTTBoard interface and returns True if it plays the reversed game, where completing a line loses. It completes a line that holds only one player's marks on a clone of the board and checks whom check_win names as the winner. If every line holds both players' marks no one can win, so the rule makes no difference and False is returned.
+    """
+
+    dim = board.get_dim()
+    lines = [ [(row, col) for col in range(0, dim)] for row in range(0, dim) ]
+    lines.extend([ [(row, col) for row in range(0, dim)] for col in range(0, dim) ])
+    lines.append([(idx, idx) for idx in range(0, dim)])
+    lines.append([(idx, dim - idx - 1) for idx in range(0, dim)])
+
+    winner = board.check_win()
+    for player in (provided.PLAYERX, provided.PLAYERO):
+        for line in lines:
+            owners = set([board.square(row, col) for row, col in line])
+            if winner in (provided.PLAYERX, provided.PLAYERO):
+                # The game is already over, so look for the line that ended it
+                if owners == set([player]):
+                    return winner != player
+            elif owners <= set([player, provided.EMPTY]):
+                probe = board.clone()
+                for row, col in line:
+                    probe.move(row, col, player)
+                return probe.check_win() != player
+    return False
+
+
+
+# Bitboard backend.  Square (row, col) is bit row * dim + col of one
+# integer mask per player.  Winning lines and the empty square lookup
+# tables for each dimension are computed once and cached.
+_WIN_MASKS = {}
+_SQUARE_TABLES = {}
+
+def win_masks(dim):
+    """
+    Return the list of row, column and diagonal masks for boards of
+    the given dimension.
+    """
+    if dim not in _WIN_MASKS:
+        masks = []
+        for row in range(dim):
+            masks.append(sum([1 << (row * dim + col) for col in range(dim)]))
+        for col in range(dim):
+            masks.append(sum([1 << (row * dim + col) for row in range(dim)]))
+        masks.append(sum([1 << (idx * dim + idx) for idx in range(dim)]))
+        masks.append(sum([1 << (idx * dim + dim - idx - 1) for idx in range(dim)]))
+        _WIN_MASKS[dim] = masks
+    return _WIN_MASKS[dim]
+
+def _square_tables(dim):
+    """
+    Return, for each byte of a mask of the given dimension, a tuple of
+    (shift, table) where table maps every byte value to the list of
+    (row, col) squares whose bits are set in it.
+    """
+    if dim not in _SQUARE_TABLES:
+        tables = []
+        for shift in range(0, dim * dim, 8):
+            table = []
+            for byte in range(256):
+                table.append([((shift + bit) // dim, (shift + bit) % dim)
+                              for bit in range(8)
+                              if byte >> bit & 1 and shift + bit < dim * dim])
+            tables.append((shift, table))
+        _SQUARE_TABLES[dim] = tables
+    return _SQUARE_TABLES[dim]
+
+class BitboardTTTBoard:
+    """
+    Tic-Tac-Toe board stored as one bit mask per player.  Has the same
+    interface as provided.TTTBoard, so mc_trial, mc_update_scores and
+    mc_move work on it unchanged.
+    """
+
+    def __init__(self, dim, reverse=False, board=None):
+        self._dim = dim
+        self._reverse = reverse
+        self._full = (1 << (dim * dim)) - 1
+        self._win_masks = win_masks(dim)
+        self._square_tables = _square_tables(dim)
+        self._x_mask = 0
+        self._o_mask = 0
+        if board != None:
+            for row in range(dim):
+                for col in range(dim):
+                    if board[row][col] != provided.EMPTY:
+                        self.move(row, col, board[row][col])
+
+    def __str__(self):
+        """
+        Human readable representation of the board.
+        """
+        symbols = {provided.EMPTY: " ", provided.PLAYERX: "X", provided.PLAYERO: "O"}
+        lines = []
+        for row in range(self._dim):
+            lines.append(" | ".join([symbols[self.square(row, col)] for col in range(self._dim)]))
+        return ("\n" + "-" * (4 * self._dim - 3) + "\n").join(lines)
+
+    def get_dim(self):
+        """
+        Return the dimension of the board.
+        """
+        return self._dim
+
+    def square(self, row, col):
+        """
+        Return the status (EMPTY, PLAYERX, PLAYERO) of the square at
+        position (row, col).
+        """
+        bit = 1 << (row * self._dim + col)
+        if self._x_mask & bit:
+            return provided.PLAYERX
+        elif self._o_mask & bit:
+            return provided.PLAYERO
+        return provided.EMPTY
+
+    def get_empty_mask(self):
+        """
+        Return the bit mask of empty squares.
+        """
+        return self._full & ~(self._x_mask | self._o_mask)
+
+    def get_empty_squares(self):
+        """
+        Return a list of (row, col) tuples for all empty squares.
+        """
+        empty = []
+        mask = self._full & ~(self._x_mask | self._o_mask)
+        for shift, table in self._square_tables:
+            empty.extend(table[(mask >> shift) & 0xFF])
+        return empty
+
+    def move(self, row, col, player):
+        """
+        Place player on the board at position (row, col).  Does
+        nothing if the square is not empty.
+        """
+        bit = 1 << (row * self._dim + col)
+        if (self._x_mask | self._o_mask) & bit:
+            return
+        if player == provided.PLAYERX:
+            self._x_mask |= bit
+        else:
+            self._o_mask |= bit
+
+    def check_win(self):
+        """
+        Return PLAYERX or PLAYERO if that player has won, DRAW if the
+        board is full with no winner and None if the game is still in
+        progress.
+        """
+        for player, mask in ((provided.PLAYERX, self._x_mask), (provided.PLAYERO, self._o_mask)):
+            for line in self._win_masks:
+                if mask & line == line:
+                    if self._reverse:
+                        return provided.switch_player(player)
+                    return player
+
+        if self._x_mask | self._o_mask == self._full:
+            return provided.DRAW
+        return None
+
+    def clone(self):
+        """
+        Return a copy of the board.
+        """
+        new_board = BitboardTTTBoard(self._dim, self._reverse)
+        new_board._x_mask = self._x_mask
+        new_board._o_mask = self._o_mask
+        return new_board
+
+def to_bitboard(board, reverse=False):
+    """
+    This function takes any board with the provided.TTTBoard interface and returns an equivalent BitboardTTTBoard.
+    """
+
+    dim = board.get_dim()
+    grid = [ [board.square(row, col) for col in range(0, dim)] for row in range(0, dim) ]
+    return BitboardTTTBoard(dim, reverse, grid)
+
+
+def main(argv=None):
+    """
+    This function plays a test game against mc_move from the command line, in the console or, with --gui, in the GUI.
+    """
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Play Monte Carlo Tic-Tac-Toe.")
+    parser.add_argument("--trials", type=int, default=NTRIALS, help="trials per move")
+    parser.add_argument("--reverse", action="store_true", help="play the reverse game")
+    parser.add_argument("--gui", action="store_true", help="play against mc_move in the GUI")
+    parser.add_argument("--dim", type=int, default=3, help="board dimension in the GUI")
+    args = parser.parse_args(argv)
+
+    if args.gui:
+        import poc_ttt_gui
+        poc_ttt_gui.run_gui(args.dim, provided.PLAYERX, mc_move, args.trials, args.reverse)
+    else:
+        provided.play_game(mc_move, args.trials, args.reverse)
 
-# Test game with the console or the GUI.  Uncomment whichever
-# you prefer.  Both should be commented out when you submit
-# for testing to save time.
 
-# provided.play_game(mc_move, NTRIALS, False)
-# poc_ttt_gui.run_gui(3, provided.PLAYERX, mc_move, NTRIALS, False)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Batched Monte Carlo Tic-Tac-Toe Player.  Plays many random games at
+once on a NumPy array of shape (games, dim, dim).
+"""
+
+import numpy
+import week3_tic_tac_toe as ttt
+
+provided = ttt.provided
+
+# Largest number of games played in one batch by mc_move_batch
+BATCH_SIZE = 10000
+
+def _lines(dim):
+    """
+    Return an array with the flat square indices of every row, column
+    and diagonal of a board with the given dimension.
+    """
+    lines = []
+    for row in range(dim):
+        lines.append([row * dim + col for col in range(dim)])
+    for col in range(dim):
+        lines.append([row * dim + col for row in range(dim)])
+    lines.append([idx * dim + idx for idx in range(dim)])
+    lines.append([idx * dim + dim - idx - 1 for idx in range(dim)])
+    return numpy.array(lines)
+
+def board_to_array(board):
+    """
+    This function takes any board with the provided.TTTBoard interface and returns its squares as a (dim, dim) array.
+    """
+
+    dim = board.get_dim()
+    return numpy.array([ [board.square(row, col) for col in range(dim)] for row in range(dim) ])
+
+def play_random_games(board, player, num_games, reverse=None, rng=numpy.random):
+    """
+    This function plays num_games random games from board, starting with player, like num_games calls to mc_trial. Each game fills the empty squares in a random order, and the winners are found by checking every line of every game at once. Unless reverse is given, whether the game is reversed is worked out from the board with ttt.is_reversed. Returns a (num_games, dim, dim) array of final boards and an array of winners (PLAYERX, PLAYERO or DRAW).
+    """
+
+    if reverse == None:
+        reverse = ttt.is_reversed(board)
+    dim = board.get_dim()
+    start = board_to_array(board).ravel()
+    empty = numpy.nonzero(start == provided.EMPTY)[0]
+    other = provided.switch_player(player)
+
+    # A random order for the empty squares; move_time[game, square] is
+    # the ply on which that square gets played, -1 if it started full
+    order = numpy.argsort(rng.random_sample((num_games, len(empty))), axis=1)
+    plies = numpy.empty_like(order)
+    plies[numpy.arange(num_games)[:, numpy.newaxis], order] = numpy.arange(len(empty))
+    move_time = numpy.full((num_games, dim * dim), -1, dtype=numpy.int64)
+    move_time[:, empty] = plies
+    owners = numpy.tile(start, (num_games, 1))
+    owners[:, empty] = numpy.where(plies % 2 == 0, player, other)
+
+    # A line is won on the ply its last square is played, if one player
+    # owns all of it; the game stops at the earliest such ply
+    lines = _lines(dim)
+    line_owners = owners[:, lines]
+    line_won = ((line_owners == line_owners[:, :, :1]).all(axis=2)
+                & (line_owners[:, :, 0] != provided.EMPTY))
+    never = len(empty)
+    won_time = numpy.where(line_won, move_time[:, lines].max(axis=2), never)
+    first_line = won_time.argmin(axis=1)
+    end_time = won_time[numpy.arange(num_games), first_line]
+
+    winners = numpy.where(end_time < never,
+                          line_owners[numpy.arange(num_games), first_line, 0],
+                          provided.DRAW)
+    if reverse:
+        winners = numpy.where(winners == player, other,
+                              numpy.where(winners == other, player, winners))
+
+    owners[move_time > end_time[:, numpy.newaxis]] = provided.EMPTY
+    return owners.reshape(num_games, dim, dim), winners
+
+def score_games(boards, winners, player):
+    """
+    This function takes an array of completed boards, their winners and which player the machine player is, and returns the summed grid of scores that mc_update_scores would build from them, as a (dim, dim) array.
+    """
+
+    machine_win = winners == player
+    machine_loss = (winners != player) & (winners != provided.DRAW)
+    machine_weight = numpy.where(machine_win, ttt.SCORE_CURRENT,
+                                 numpy.where(machine_loss, -ttt.SCORE_OTHER, 0.0))
+    other_weight = numpy.where(machine_win, -ttt.SCORE_CURRENT,
+                               numpy.where(machine_loss, ttt.SCORE_OTHER, 0.0))
+
+    machine_here = boards == player
+    other_here = (boards != player) & (boards != provided.EMPTY)
+    return (numpy.tensordot(machine_weight, machine_here, axes=1)
+            + numpy.tensordot(other_weight, other_here, axes=1))
+
+def mc_move_batch(board, player, trials, seed=None):
+    """
+    This function works like mc_move, but plays the trials BATCH_SIZE games at a time with play_random_games and score_games, then picks the move with get_best_move. Whether the game is reversed is worked out from the board once, with ttt.is_reversed.
+    """
+
+    reverse = ttt.is_reversed(board)
+    rng = numpy.random.RandomState(seed)
+    dim = board.get_dim()
+    scores = numpy.zeros((dim, dim))
+    remaining = trials
+    while remaining > 0:
+        num_games = min(remaining, BATCH_SIZE)
+        boards, winners = play_random_games(board, player, num_games, reverse, rng)
+        scores += score_games(boards, winners, player)
+        remaining -= num_games
+
+    return ttt.get_best_move(board, scores.tolist())
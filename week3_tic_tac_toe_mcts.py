@@ -0,0 +1,177 @@
+"""
+Monte Carlo Tree Search Tic-Tac-Toe Player
+UCT search that uses mc_trial for its random playouts.
+"""
+
+import math
+import random
+import time
+import week3_tic_tac_toe as ttt
+
+provided = ttt.provided
+
+# Default UCT exploration constant
+EXPLORATION = math.sqrt(2)
+
+class _Node:
+    """
+    Search tree node for the position after player_moved played move.
+    """
+
+    def __init__(self, parent, move, player_moved, untried):
+        self.parent = parent
+        self.move = move
+        self.player_moved = player_moved
+        self.untried = untried
+        self.children = {}
+        self.wins = 0.0
+        self.visits = 0
+
+    def select_child(self, exploration):
+        """
+        Return the child with the highest UCT value.
+        """
+        log_visits = math.log(self.visits)
+        best_child = None
+        best_value = None
+        for child in self.children.values():
+            value = (child.wins / child.visits
+                     + exploration * math.sqrt(log_visits / child.visits))
+            if best_child is None or value > best_value:
+                best_child = child
+                best_value = value
+        return best_child
+
+class MCTSPlayer:
+    """
+    UCT player.  Keeps its search tree between calls, so the subtree
+    for the position after the opponent's reply is reused.
+    """
+
+    def __init__(self, exploration=EXPLORATION):
+        self._exploration = exploration
+        self._root = None
+        self._root_squares = None
+
+    def get_root(self):
+        """
+        Return the root node of the current search tree.
+        """
+        return self._root
+
+    def best_move(self, board, player, trials=None, time_limit=None):
+        """
+        Run trials iterations, or until time_limit seconds have
+        passed, whichever comes first, and return the most visited
+        (row, col) move for player, or None if the board is full.  At
+        least one of trials and time_limit must be given.
+        """
+        if trials is None and time_limit is None:
+            raise ValueError("either trials or time_limit is required")
+        if not board.get_empty_squares():
+            return None
+
+        self._set_root(board, player)
+        deadline = None
+        if time_limit is not None:
+            deadline = time.time() + time_limit
+
+        iterations = 0
+        while trials is None or iterations < trials:
+            if deadline is not None and time.time() > deadline:
+                break
+            self._iterate(board)
+            iterations += 1
+
+        if not self._root.children:
+            return random.choice(board.get_empty_squares())
+        best = max(self._root.children.values(), key=lambda child: child.visits)
+        return best.move
+
+    def _squares(self, board):
+        """
+        Return the contents of every square of board as a tuple.
+        """
+        dim = board.get_dim()
+        return tuple([board.square(row, col) for row in range(dim) for col in range(dim)])
+
+    def _set_root(self, board, player):
+        """
+        Make the root match board with player to move, reusing a
+        subtree of the previous tree if one matches.
+        """
+        squares = self._squares(board)
+        if self._root is not None and self._root_squares is not None:
+            if squares == self._root_squares:
+                if self._root.player_moved != player:
+                    return
+            elif len(squares) == len(self._root_squares):
+                subtree = self._find_subtree(board.get_dim(), squares, player)
+                if subtree is not None:
+                    subtree.parent = None
+                    self._root = subtree
+                    self._root_squares = squares
+                    return
+
+        self._root = _Node(None, None, provided.switch_player(player),
+                           board.get_empty_squares())
+        self._root_squares = squares
+
+    def _find_subtree(self, dim, squares, player):
+        """
+        Return the node one or two moves below the root whose position
+        is squares with player to move, or None.
+        """
+        frontier = [(self._root, list(self._root_squares))]
+        for dummy_depth in range(2):
+            next_frontier = []
+            for node, node_squares in frontier:
+                for child in node.children.values():
+                    child_squares = list(node_squares)
+                    child_squares[child.move[0] * dim + child.move[1]] = child.player_moved
+                    if tuple(child_squares) == squares and child.player_moved != player:
+                        return child
+                    next_frontier.append((child, child_squares))
+            frontier = next_frontier
+        return None
+
+    def _iterate(self, board):
+        """
+        Run one selection, expansion, playout and backpropagation step
+        from a copy of board.
+        """
+        node = self._root
+        trial_board = board.clone()
+
+        while not node.untried and node.children:
+            node = node.select_child(self._exploration)
+            trial_board.move(node.move[0], node.move[1], node.player_moved)
+
+        if node.untried and trial_board.check_win() == None:
+            move = node.untried.pop(random.randrange(len(node.untried)))
+            player = provided.switch_player(node.player_moved)
+            trial_board.move(move[0], move[1], player)
+            child = _Node(node, move, player, trial_board.get_empty_squares())
+            node.children[move] = child
+            node = child
+
+        ttt.mc_trial(trial_board, provided.switch_player(node.player_moved))
+        winner = trial_board.check_win()
+
+        while node is not None:
+            node.visits += 1
+            if winner == node.player_moved:
+                node.wins += 1.0
+            elif winner == provided.DRAW:
+                node.wins += 0.5
+            node = node.parent
+
+# Player shared by every call to mcts_move, so the tree is reused
+_PLAYER = MCTSPlayer()
+
+def mcts_move(board, player, trials):
+    """
+    This function takes a current board, which player the machine player is, and the number of trials to run. It returns the move chosen by UCT search in the form of a (row, column) tuple.
+    """
+
+    return _PLAYER.best_move(board, player, trials)
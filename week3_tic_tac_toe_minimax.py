@@ -0,0 +1,306 @@
+"""
+Minimax Tic-Tac-Toe Player
+Alpha-beta search over bitboards, with a transposition table shared by
+all positions that are equal under the 8 symmetries of the board.
+"""
+
+import pickle
+import time
+import week3_tic_tac_toe as ttt
+
+provided = ttt.provided
+
+# Boards up to this dimension are searched to the end of the game;
+# larger boards use iterative deepening under TIME_LIMIT seconds
+SOLVE_DIM = 3
+TIME_LIMIT = 1.0
+
+# Score of a won game, plus one for every square left empty so that
+# faster wins are preferred
+WIN_SCORE = 100
+
+# Transposition table entry kinds
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+class _SearchTimeout(Exception):
+    """
+    Raised inside the search when the time limit runs out.
+    """
+    pass
+
+def _symmetries(dim):
+    """
+    Return the 8 rotations and reflections of a board of the given
+    dimension, each as a list mapping a square index to its image.
+    """
+    transforms = [lambda row, col: (row, col),
+                  lambda row, col: (col, dim - 1 - row),
+                  lambda row, col: (dim - 1 - row, dim - 1 - col),
+                  lambda row, col: (dim - 1 - col, row),
+                  lambda row, col: (row, dim - 1 - col),
+                  lambda row, col: (dim - 1 - row, col),
+                  lambda row, col: (col, row),
+                  lambda row, col: (dim - 1 - col, dim - 1 - row)]
+    symmetries = []
+    for transform in transforms:
+        image = []
+        for index in range(dim * dim):
+            row, col = transform(index // dim, index % dim)
+            image.append(row * dim + col)
+        symmetries.append(image)
+    return symmetries
+
+class MinimaxPlayer:
+    """
+    Exact or depth-limited minimax player for boards of one dimension.
+    """
+
+    def __init__(self, dim, reverse=False, time_limit=TIME_LIMIT):
+        self._dim = dim
+        self._reverse = reverse
+        self._time_limit = time_limit
+        self._full = (1 << (dim * dim)) - 1
+        self._table = {}
+        self._deadline = None
+
+        lines = ttt.win_masks(dim)
+        self._lines_through = [[line for line in lines if line >> index & 1]
+                               for index in range(dim * dim)]
+
+        # For every symmetry, one table per byte of a mask that maps
+        # the byte value to the image of its bits
+        self._symmetry_tables = []
+        for image in _symmetries(dim):
+            tables = []
+            for shift in range(0, dim * dim, 8):
+                table = []
+                for byte in range(256):
+                    bits = 0
+                    for bit in range(8):
+                        if byte >> bit & 1 and shift + bit < dim * dim:
+                            bits |= 1 << image[shift + bit]
+                    table.append(bits)
+                tables.append((shift, table))
+            self._symmetry_tables.append(tables)
+
+    def get_table(self):
+        """
+        Return the transposition table.
+        """
+        return self._table
+
+    def save_table(self, filename):
+        """
+        Write the transposition table to a file.
+        """
+        with open(filename, "wb") as table_file:
+            pickle.dump((self._dim, self._reverse, self._table), table_file, 2)
+
+    def load_table(self, filename):
+        """
+        Replace the transposition table with one written by
+        save_table for the same dimension and rules.
+        """
+        with open(filename, "rb") as table_file:
+            dim, reverse, table = pickle.load(table_file)
+        if dim != self._dim or reverse != self._reverse:
+            raise ValueError("table was built for a different board")
+        self._table = table
+
+    def solve(self):
+        """
+        Compute the exact value of every position reachable from the
+        empty board and store them all in the table, so that later
+        moves are table lookups.
+        """
+        self._deadline = None
+        self._solve(0, 0)
+
+    def best_move(self, board, player):
+        """
+        Return the best (row, col) move for player on board.  Searches
+        to the end of the game on small boards, and otherwise deepens
+        the search until the time limit runs out.
+        """
+        mover, other = self._masks(board, player)
+        empty = self._full & ~(mover | other)
+        if not empty:
+            return None
+
+        max_depth = bin(empty).count("1")
+        if self._dim <= SOLVE_DIM:
+            self._deadline = None
+            move = self._search_root(mover, other, max_depth, None)
+        else:
+            self._deadline = time.time() + self._time_limit
+            move = None
+            try:
+                for depth in range(1, max_depth + 1):
+                    move = self._search_root(mover, other, depth, move)
+            except _SearchTimeout:
+                pass
+            self._deadline = None
+            if move is None:
+                lowest = empty & -empty
+                move = lowest.bit_length() - 1
+
+        return (move // self._dim, move % self._dim)
+
+    def _masks(self, board, player):
+        """
+        Return the masks of the squares held by player and by the
+        other player.
+        """
+        mover = 0
+        other = 0
+        for row in range(self._dim):
+            for col in range(self._dim):
+                square = board.square(row, col)
+                if square == player:
+                    mover |= 1 << (row * self._dim + col)
+                elif square != provided.EMPTY:
+                    other |= 1 << (row * self._dim + col)
+        return mover, other
+
+    def _key(self, mover, other):
+        """
+        Return the transposition table key of a position, the same for
+        every rotation and reflection of it.
+        """
+        key = None
+        for tables in self._symmetry_tables:
+            new_mover = 0
+            new_other = 0
+            for shift, table in tables:
+                new_mover |= table[(mover >> shift) & 0xFF]
+                new_other |= table[(other >> shift) & 0xFF]
+            if key is None or (new_mover, new_other) < key:
+                key = (new_mover, new_other)
+        return key
+
+    def _move_value(self, mover, other, index):
+        """
+        Return the value of the game for mover if it ends with mover
+        playing square index, or None if the game goes on.
+        """
+        new_mover = mover | (1 << index)
+        for line in self._lines_through[index]:
+            if new_mover & line == line:
+                value = WIN_SCORE + bin(self._full & ~(new_mover | other)).count("1")
+                if self._reverse:
+                    return -value
+                return value
+        if new_mover | other == self._full:
+            return 0
+        return None
+
+    def _search_root(self, mover, other, depth, first_move):
+        """
+        Return the index of the best square for mover at the given
+        depth, trying first_move first.
+        """
+        empty = self._full & ~(mover | other)
+        moves = [index for index in range(self._dim * self._dim) if empty >> index & 1]
+        if first_move in moves:
+            moves.remove(first_move)
+            moves.insert(0, first_move)
+
+        best_move = None
+        alpha = -2 * WIN_SCORE
+        for index in moves:
+            value = self._move_value(mover, other, index)
+            if value is None:
+                value = -self._negamax(other, mover | (1 << index), depth - 1,
+                                       -2 * WIN_SCORE, -alpha)
+            if best_move is None or value > alpha:
+                best_move = index
+                alpha = value
+        return best_move
+
+    def _negamax(self, mover, other, depth, alpha, beta):
+        """
+        Return the value of the position for mover, searching depth
+        more moves with alpha-beta pruning.  Positions cut off by the
+        depth limit count as draws.
+        """
+        if depth <= 0:
+            return 0
+        if self._deadline is not None and time.time() > self._deadline:
+            raise _SearchTimeout()
+
+        key = self._key(mover, other)
+        entry = self._table.get(key)
+        if entry is not None and entry[0] >= depth:
+            entry_depth, kind, value = entry
+            if kind == EXACT:
+                return value
+            elif kind == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+        original_alpha = alpha
+        best = -2 * WIN_SCORE
+        empty = self._full & ~(mover | other)
+        while empty:
+            lowest = empty & -empty
+            empty ^= lowest
+            index = lowest.bit_length() - 1
+            value = self._move_value(mover, other, index)
+            if value is None:
+                value = -self._negamax(other, mover | lowest, depth - 1, -beta, -alpha)
+            best = max(best, value)
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if best <= original_alpha:
+            kind = UPPER
+        elif best >= beta:
+            kind = LOWER
+        else:
+            kind = EXACT
+        self._table[key] = (depth, kind, best)
+        return best
+
+    def _solve(self, mover, other):
+        """
+        Return the exact value of the position for mover, storing it
+        and every position below it in the table.
+        """
+        key = self._key(mover, other)
+        empty = self._full & ~(mover | other)
+        depth = bin(empty).count("1")
+        entry = self._table.get(key)
+        if entry is not None and entry[0] >= depth and entry[1] == EXACT:
+            return entry[2]
+
+        best = -2 * WIN_SCORE
+        while empty:
+            lowest = empty & -empty
+            empty ^= lowest
+            value = self._move_value(mover, other, lowest.bit_length() - 1)
+            if value is None:
+                value = -self._solve(other, mover | lowest)
+            best = max(best, value)
+
+        self._table[key] = (depth, EXACT, best)
+        return best
+
+# One player per (dimension, reverse), shared by every call to minimax_move
+_PLAYERS = {}
+
+def minimax_move(board, player, trials):
+    """
+    This function takes a current board, which player the machine player is, and a trials argument that is only there so it can be used in place of mc_move. It returns the minimax move for the machine player in the form of a (row, column) tuple. Whether the game is reversed is worked out from the board with ttt.is_reversed.
+    """
+
+    dim = board.get_dim()
+    reverse = ttt.is_reversed(board)
+    if (dim, reverse) not in _PLAYERS:
+        _PLAYERS[(dim, reverse)] = MinimaxPlayer(dim, reverse)
+    return _PLAYERS[(dim, reverse)].best_move(board, player)
@@ -3,9 +3,15 @@ Planner for Yahtzee
 Simplifications:  only allow discard and roll, only score against upper level
 """
 
-# Used to increase the timeout, if necessary
-import codeskulptor
-codeskulptor.set_timeout(20)
+import collections
+import math
+import pickle
+
+# Scores of sorted hands, filled in by sorted_score
+_SCORES = {}
+
+# Largest number of holds kept in the shared hold cache
+HOLD_CACHE_SIZE = 100000
 
 def gen_all_sequences(outcomes, length):
     """
@@ -25,6 +31,51 @@ def gen_all_sequences(outcomes, length):
     return answer_set
 
 
+def _unique(items):
+    """
+    Return the distinct items in order of first appearance.
+    """
+    seen = set()
+    unique = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            unique.append(item)
+    return unique
+
+
+def iter_all_sequences(outcomes, length, sorted_output=False):
+    """
+    Generator that yields each sequence of outcomes of given length
+    once, like gen_all_sequences but without building the set.  With
+    sorted_output, only sorted sequences are yielded, one for each
+    combination of outcomes.
+    """
+    outcomes = _unique(outcomes)
+    if sorted_output:
+        outcomes.sort()
+    if length > 0 and not outcomes:
+        return
+
+    # Odometer of indices into outcomes, last position fastest
+    indices = [0] * length
+    while True:
+        yield tuple([outcomes[index] for index in indices])
+
+        position = length - 1
+        while position >= 0 and indices[position] == len(outcomes) - 1:
+            position -= 1
+        if position < 0:
+            return
+        indices[position] += 1
+        if sorted_output:
+            reset = indices[position]
+        else:
+            reset = 0
+        for later in range(position + 1, length):
+            indices[later] = reset
+
+
 def score(hand):
     """
     Compute the maximal score for a Yahtzee hand according to the
@@ -56,19 +107,130 @@ def expected_value(held_dice, num_die_sides, num_free_dice):
     # As an example, in a standard Yahtzee game using five dice,
     # the length of held_dice + num_free_dice should always be five
     outcomes = [ number+1 for number in range(num_die_sides) ]
-    possible_rolls = gen_all_sequences(outcomes, num_free_dice)
+    num_rolls = 0
     expected_val = 0
     total_score = 0
 
-    for each_roll in possible_rolls:
+    for each_roll in iter_all_sequences(outcomes, num_free_dice):
         total_dice = held_dice + each_roll
         total_score += score(total_dice)
+        num_rolls += 1
 
-    expected_val += total_score * 1.0 / len(possible_rolls)
+    expected_val += total_score * 1.0 / num_rolls
 
     return expected_val
 
 
+def count_orderings(sequence):
+    """
+    Compute the number of distinct orderings of a sequence, n! over
+    the product of the factorials of the counts of each value.
+
+    Returns an integer
+    """
+    orderings = math.factorial(len(sequence))
+    for item in set(sequence):
+        orderings //= math.factorial(sequence.count(item))
+    return orderings
+
+
+def sorted_score(hand):
+    """
+    Compute score(hand) for a sorted hand, remembering the result so
+    each distinct hand is only scored once.
+
+    hand: sorted yahtzee hand
+
+    Returns an integer score
+    """
+    if hand not in _SCORES:
+        _SCORES[hand] = score(hand)
+    return _SCORES[hand]
+
+
+def expected_value_multiset(held_dice, num_die_sides, num_free_dice):
+    """
+    Compute the same value as expected_value, but enumerate each
+    multiset of free dice once, weighted by its number of orderings,
+    instead of every ordered roll.
+
+    held_dice: dice that you will hold
+    num_die_sides: number of sides on each die
+    num_free_dice: number of dice to be rolled
+
+    Returns a floating point expected value
+    """
+    outcomes = [ number+1 for number in range(num_die_sides) ]
+    total_score = 0
+
+    for each_roll in iter_all_sequences(outcomes, num_free_dice, True):
+        total_dice = tuple(sorted(held_dice + each_roll))
+        total_score += count_orderings(each_roll) * sorted_score(total_dice)
+
+    # The sum is an integer, so this matches expected_value exactly
+    return total_score * 1.0 / num_die_sides ** num_free_dice
+
+
+class HoldCache:
+    """
+    Least recently used cache of expected values, keyed by
+    (sorted hold, num_die_sides, num_free_dice).
+    """
+
+    def __init__(self, max_size=HOLD_CACHE_SIZE):
+        self._max_size = max_size
+        self._values = collections.OrderedDict()
+
+    def __len__(self):
+        """
+        Return the number of cached holds
+        """
+        return len(self._values)
+
+    def expected_value(self, held_dice, num_die_sides, num_free_dice):
+        """
+        Return expected_value_multiset for the hold, computing it only
+        if the same sorted hold has not been seen before.
+        """
+        key = (tuple(sorted(held_dice)), num_die_sides, num_free_dice)
+        if key in self._values:
+            value = self._values.pop(key)
+        else:
+            value = expected_value_multiset(key[0], num_die_sides, num_free_dice)
+            if len(self._values) >= self._max_size:
+                self._values.popitem(last=False)
+        self._values[key] = value
+        return value
+
+    def clear(self):
+        """
+        Remove every cached hold
+        """
+        self._values.clear()
+
+    def save(self, filename):
+        """
+        Write the cached holds to a file
+        """
+        with open(filename, "wb") as cache_file:
+            pickle.dump(list(self._values.items()), cache_file, 2)
+
+    def load(self, filename):
+        """
+        Add the holds saved in a file to the cache
+        """
+        with open(filename, "rb") as cache_file:
+            for key, value in pickle.load(cache_file):
+                self._values.pop(key, None)
+                self._values[key] = value
+        while len(self._values) > self._max_size:
+            self._values.popitem(last=False)
+
+
+# Cache shared by every strategy call
+HOLD_CACHE = HoldCache()
+
+
 def gen_all_holds(hand):
     """
     Generate all possible choices of dice from hand to hold.
@@ -88,6 +250,47 @@ def gen_all_holds(hand):
     return holds
 
 
+def iter_all_holds(hand, sorted_output=False):
+    """
+    Generator that yields each hold in gen_all_holds(hand) once,
+    without building the set.  With sorted_output, each distinct
+    sorted hold is yielded once instead.
+
+    hand: full yahtzee hand
+    """
+    if sorted_output:
+        # Odometer over how many of each distinct value to hold
+        values = sorted(_unique(hand))
+        limits = [hand.count(value) for value in values]
+        counts = [0] * len(values)
+        while True:
+            hold = ()
+            for value, count in zip(values, counts):
+                hold += (value, ) * count
+            yield hold
+
+            position = len(values) - 1
+            while position >= 0 and counts[position] == limits[position]:
+                counts[position] = 0
+                position -= 1
+            if position < 0:
+                return
+            counts[position] += 1
+
+    # Each subsequence of hand is yielded for the mask that picks the
+    # leftmost matching dice, which skips every duplicate
+    for mask in range(2 ** len(hand)):
+        hold = tuple([hand[idx] for idx in range(len(hand)) if mask >> idx & 1])
+        leftmost = 0
+        position = 0
+        for die in hold:
+            while hand[position] != die:
+                position += 1
+            leftmost |= 1 << position
+            position += 1
+        if leftmost == mask:
+            yield hold
+
 
 def strategy(hand, num_die_sides):
     """
@@ -100,32 +303,47 @@ def strategy(hand, num_die_sides):
     Returns a tuple where the first element is the expected score and
     the second element is a tuple of the dice to hold
     """
-    holds_dict = {}
-    possible_hold = gen_all_holds(hand)
+    best = None
 
-    for each_hold in possible_hold:
-        expected_val = expected_value(each_hold, num_die_sides, len(hand)-len(each_hold))
-        holds_dict[each_hold] = holds_dict.get(each_hold, expected_val)
+    for each_hold in iter_all_holds(hand):
+        expected_val = HOLD_CACHE.expected_value(each_hold, num_die_sides, len(hand)-len(each_hold))
+        if best == None or (expected_val, each_hold) > best:
+            best = (expected_val, each_hold)
 
-    temp_list = []
-    for key, value in holds_dict.items():
-        temp_list.append((value, key))
+    return best
 
-    return sorted(temp_list, reverse=True)[0]
 
-
-def run_example():
+def run_example(hand=(1, 1, 1, 5, 6), num_die_sides=6):
     """
     Compute the dice to hold and expected score for an example hand
     """
-    num_die_sides = 6
-    hand = (1, 1, 1, 5, 6)
     hand_score, hold = strategy(hand, num_die_sides)
     print "Best strategy for hand", hand, "is to hold", hold, "with expected score", hand_score
 
 
+def main(argv=None):
+    """
+    Run the example from the command line, for any hand
+    """
+    import argparse
+
+    # Used to increase the timeout, if necessary
+    try:
+        import codeskulptor
+        codeskulptor.set_timeout(20)
+    except ImportError:
+        pass
+
+    parser = argparse.ArgumentParser(description="Find the best Yahtzee hold for a hand.")
+    parser.add_argument("hand", type=int, nargs="*", default=[1, 1, 1, 5, 6],
+                        help="dice in the hand")
+    parser.add_argument("--sides", type=int, default=6, help="sides on each die")
+    args = parser.parse_args(argv)
+    run_example(tuple(args.hand), args.sides)
+
 
-run_example()
+if __name__ == "__main__":
+    main()
 
 
 #import poc_holds_testsuite
@@ -0,0 +1,154 @@
+"""
+Batch planner for Yahtzee
+Finds the best hold for many hands at once across a process pool and
+writes the results as columns to a CSV or .npy file.
+"""
+
+import csv
+import sys
+import time
+import week4_yahtzee as yahtzee
+
+# Hands per pool task; nearby sorted hands share most of their holds
+CHUNK_SIZE = 200
+
+
+def gen_all_hands(num_dice, num_die_sides):
+    """
+    Generate every distinct hand of num_dice dice, as sorted tuples.
+    """
+    outcomes = [ number+1 for number in range(num_die_sides) ]
+    return yahtzee.iter_all_sequences(outcomes, num_dice, True)
+
+
+def dedupe_hands(hands):
+    """
+    Sort the dice of every hand and drop repeats.
+
+    Returns a sorted list of tuples
+    """
+    return sorted(set([tuple(sorted(hand)) for hand in hands]))
+
+
+def _evaluate_chunk(args):
+    """
+    Run strategy on every hand of a chunk.  Runs in worker processes,
+    each with its own hold cache.
+
+    Returns the list of (expected score, hold) results and the time taken
+    """
+    hands, num_die_sides = args
+    start = time.time()
+    results = [yahtzee.strategy(hand, num_die_sides) for hand in hands]
+    return results, time.time() - start
+
+
+def evaluate_hands(num_die_sides, hands, processes=None, chunk_size=CHUNK_SIZE,
+                   progress=sys.stderr):
+    """
+    Compute the best hold for every distinct hand in hands.  The hands
+    are split into chunks that run across a process pool, or in this
+    process if processes=1.  One line per finished chunk is written to
+    progress unless it is None.
+
+    Returns a list of (hand, expected score, hold) tuples, with hands
+    sorted
+    """
+    hands = dedupe_hands(hands)
+    chunks = [(hands[start:start + chunk_size], num_die_sides)
+              for start in range(0, len(hands), chunk_size)]
+
+    pool = None
+    if processes == 1:
+        chunk_results = (_evaluate_chunk(chunk) for chunk in chunks)
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes)
+        chunk_results = pool.imap(_evaluate_chunk, chunks)
+
+    start = time.time()
+    results = []
+    try:
+        for index, (chunk_result, chunk_time) in enumerate(chunk_results):
+            chunk_hands = chunks[index][0]
+            for hand, (value, hold) in zip(chunk_hands, chunk_result):
+                results.append((hand, value, hold))
+            if progress is not None:
+                progress.write("chunk %d/%d: %d hands in %.2fs, %.2fs elapsed\n"
+                               % (index + 1, len(chunks), len(chunk_hands),
+                                  chunk_time, time.time() - start))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return results
+
+
+def keep_flags(hand, hold):
+    """
+    Mark which dice of a sorted hand are kept by a hold.
+
+    Returns a list of 0s and 1s, one per die
+    """
+    needed = sorted(hold)
+    flags = []
+    for die in hand:
+        if needed and die == needed[0]:
+            flags.append(1)
+            needed.pop(0)
+        else:
+            flags.append(0)
+    return flags
+
+
+def write_csv(filename, results):
+    """
+    Write results from evaluate_hands as CSV with one column per die,
+    one keep flag column per die and the expected score.
+    """
+    num_dice = len(results[0][0]) if results else 0
+    with open(filename, "w") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["die_%d" % (idx + 1) for idx in range(num_dice)]
+                        + ["keep_%d" % (idx + 1) for idx in range(num_dice)]
+                        + ["expected_score"])
+        for hand, value, hold in results:
+            writer.writerow(list(hand) + keep_flags(hand, hold) + [repr(value)])
+
+
+def write_npy(filename, results):
+    """
+    Write results from evaluate_hands as a NumPy structured array with
+    fields hand, keep and expected_score.
+    """
+    import numpy
+
+    num_dice = len(results[0][0]) if results else 0
+    dtype = [("hand", numpy.int16, (num_dice, )),
+             ("keep", numpy.bool_, (num_dice, )),
+             ("expected_score", numpy.float64)]
+    table = numpy.zeros(len(results), dtype=dtype)
+    for index, (hand, value, hold) in enumerate(results):
+        table[index] = (hand, keep_flags(hand, hold), value)
+    numpy.save(filename, table)
+
+
+def run_batch(configurations, filename_format="yahtzee_%dd%d.csv", processes=None):
+    """
+    Evaluate every hand for each (num_dice, num_die_sides) pair and
+    write one file per pair, as .npy if the name ends with .npy and
+    as CSV otherwise.
+    """
+    for num_dice, num_die_sides in configurations:
+        filename = filename_format % (num_dice, num_die_sides)
+        start = time.time()
+        results = evaluate_hands(num_die_sides, gen_all_hands(num_dice, num_die_sides),
+                                 processes)
+        if filename.endswith(".npy"):
+            write_npy(filename, results)
+        else:
+            write_csv(filename, results)
+        sys.stderr.write("%dd%d: %d hands written to %s in %.2fs\n"
+                         % (num_dice, num_die_sides, len(results), filename,
+                            time.time() - start))
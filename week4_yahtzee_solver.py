@@ -0,0 +1,242 @@
+"""
+Dynamic programming solver for a whole Yahtzee turn
+The turn has an initial roll plus up to two rerolls.  The table holds
+the value and the best hold of every (sorted dice, rerolls left) state.
+"""
+
+import array
+import struct
+import week4_yahtzee as yahtzee
+
+# Rolls in a turn, counting the first one
+ROLLS_PER_TURN = 3
+
+# Header of a saved table: magic, number of dice, sides, rolls
+_HEADER = struct.Struct("<4sHHH")
+_MAGIC = b"YZDP"
+
+
+def gen_all_multisets(num_die_sides, num_dice):
+    """
+    Enumerate every sorted hand of num_dice dice with num_die_sides
+    sides, in sorted order.
+
+    Returns a list of tuples
+    """
+    outcomes = [ number+1 for number in range(num_die_sides) ]
+    return list(yahtzee.iter_all_sequences(outcomes, num_dice, True))
+
+
+def gen_sorted_holds(hand):
+    """
+    Generate every distinct hold of a hand, each as a sorted tuple.
+
+    Returns a set of tuples
+    """
+    return set(yahtzee.iter_all_holds(hand, True))
+
+
+def hold_to_mask(dice, hold):
+    """
+    Encode a sorted hold as a bit mask of positions in the sorted dice.
+
+    Returns an integer
+    """
+    needed = list(hold)
+    mask = 0
+    for position in range(len(dice)):
+        if needed and dice[position] == needed[0]:
+            mask |= 1 << position
+            needed.pop(0)
+    return mask
+
+
+def mask_to_hold(dice, mask):
+    """
+    Decode a bit mask made by hold_to_mask back into a sorted hold.
+
+    Returns a tuple
+    """
+    return tuple([dice[position] for position in range(len(dice)) if mask >> position & 1])
+
+
+def _hold_values(args):
+    """
+    Compute the expected value of each hold when the other dice are
+    rolled, given the values of the states after the roll.  Run in
+    worker processes by TurnTable.build.
+
+    Returns a list of floats
+    """
+    holds, num_dice, num_die_sides, next_values = args
+    outcomes = [ number+1 for number in range(num_die_sides) ]
+    rolls = {}
+    values = []
+    for hold in holds:
+        num_free_dice = num_dice - len(hold)
+        if num_free_dice not in rolls:
+            rolls[num_free_dice] = [(roll, yahtzee.count_orderings(roll))
+                                    for roll in yahtzee.iter_all_sequences(outcomes, num_free_dice, True)]
+        total = 0
+        for roll, weight in rolls[num_free_dice]:
+            total += weight * next_values[tuple(sorted(hold + roll))]
+        values.append(total * 1.0 / num_die_sides ** num_free_dice)
+    return values
+
+
+class TurnTable:
+    """
+    Optimal holds for every state of a turn with num_dice dice of
+    num_die_sides sides.  Hands are scored with score_function, which
+    takes a sorted hand, so other categories can be plugged in.
+    """
+
+    def __init__(self, num_dice, num_die_sides, rolls=ROLLS_PER_TURN,
+                 score_function=yahtzee.score):
+        self._num_dice = num_dice
+        self._num_die_sides = num_die_sides
+        self._rolls = rolls
+        self._score_function = score_function
+        self._states = gen_all_multisets(num_die_sides, num_dice)
+        self._index = dict([(state, index) for index, state in enumerate(self._states)])
+        # _values[rerolls][index] and _holds[rerolls][index], with
+        # _holds[0] unused because no reroll is left to choose
+        self._values = []
+        self._holds = []
+
+    def get_num_dice(self):
+        """
+        Return the number of dice in a hand
+        """
+        return self._num_dice
+
+    def get_num_die_sides(self):
+        """
+        Return the number of sides on each die
+        """
+        return self._num_die_sides
+
+    def build(self, processes=None, chunk_size=1000):
+        """
+        Fill the table one reroll level at a time.  The holds of each
+        level are split into chunks that run across a process pool;
+        processes=1 builds in this process.
+        """
+        final_values = [self._score_function(state) for state in self._states]
+        self._values = [array.array("d", final_values)]
+        self._holds = [array.array("H", [0] * len(self._states))]
+
+        holds = set()
+        for state in self._states:
+            holds.update(gen_sorted_holds(state))
+        holds = sorted(holds)
+
+        pool = None
+        if processes != 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(processes)
+        try:
+            for dummy_level in range(1, self._rolls):
+                next_values = dict(zip(self._states, self._values[-1]))
+                chunks = [(holds[start:start + chunk_size], self._num_dice,
+                           self._num_die_sides, next_values)
+                          for start in range(0, len(holds), chunk_size)]
+                if pool is None:
+                    chunk_values = [_hold_values(chunk) for chunk in chunks]
+                else:
+                    chunk_values = pool.map(_hold_values, chunks)
+                hold_values = {}
+                for chunk, values in zip(chunks, chunk_values):
+                    hold_values.update(zip(chunk[0], values))
+                self._add_level(hold_values)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def _add_level(self, hold_values):
+        """
+        Add the values and best holds of the next reroll level, given
+        the expected value of every hold.
+        """
+        values = array.array("d")
+        masks = array.array("H")
+        for state in self._states:
+            best_value = None
+            best_hold = None
+            for hold in gen_sorted_holds(state):
+                if best_value is None or (hold_values[hold], hold) > (best_value, best_hold):
+                    best_value = hold_values[hold]
+                    best_hold = hold
+            values.append(best_value)
+            masks.append(hold_to_mask(state, best_hold))
+        self._values.append(values)
+        self._holds.append(masks)
+
+    def value(self, hand, rerolls_left=1):
+        """
+        Compute the expected final score of a hand when rerolls_left
+        rerolls remain and every hold is optimal.
+
+        Returns a float
+        """
+        return self._values[rerolls_left][self._index[tuple(sorted(hand))]]
+
+    def strategy(self, hand, rerolls_left=1):
+        """
+        Look up the best hold for a hand when rerolls_left rerolls
+        remain.  With one reroll left and the default scoring this
+        matches yahtzee.strategy, except that the hold is sorted.
+
+        Returns a tuple where the first element is the expected score and
+        the second element is a tuple of the dice to hold
+        """
+        state = tuple(sorted(hand))
+        index = self._index[state]
+        return (self._values[rerolls_left][index],
+                mask_to_hold(state, self._holds[rerolls_left][index]))
+
+    def turn_value(self):
+        """
+        Compute the expected score of a whole turn, before the first roll.
+
+        Returns a float
+        """
+        weights = [yahtzee.count_orderings(state) for state in self._states]
+        total = 0.0
+        for weight, value in zip(weights, self._values[-1]):
+            total += weight * value
+        return total / self._num_die_sides ** self._num_dice
+
+    def save(self, filename):
+        """
+        Write the table to a compact binary file: a header followed by
+        the values and hold masks of every level.
+        """
+        with open(filename, "wb") as table_file:
+            table_file.write(_HEADER.pack(_MAGIC, self._num_dice,
+                                          self._num_die_sides, self._rolls))
+            for level in range(self._rolls):
+                self._values[level].tofile(table_file)
+                self._holds[level].tofile(table_file)
+
+
+def load_turn_table(filename, score_function=yahtzee.score):
+    """
+    Read a table written by TurnTable.save.
+
+    Returns a TurnTable
+    """
+    with open(filename, "rb") as table_file:
+        magic, num_dice, num_die_sides, rolls = _HEADER.unpack(table_file.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError("not a Yahtzee turn table")
+        table = TurnTable(num_dice, num_die_sides, rolls, score_function)
+        for dummy_level in range(rolls):
+            values = array.array("d")
+            values.fromfile(table_file, len(table._states))
+            masks = array.array("H")
+            masks.fromfile(table_file, len(table._states))
+            table._values.append(values)
+            table._holds.append(masks)
+    return table
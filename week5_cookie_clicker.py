@@ -2,12 +2,11 @@
 Cookie Clicker Simulator
 """
 
+import array
+import bisect
+import heapq
 import math
-import simpleplot
-
-# Used to increase the timeout, if necessary
-import codeskulptor
-codeskulptor.set_timeout(20)
+import time
 
 import poc_clicker_provided as provided
 
@@ -15,19 +14,88 @@ import poc_clicker_provided as provided
 SIM_TIME = 10000000000.0
 # SIM_TIME = 10000.0
 
+# Purchases searched ahead by strategy_lookahead and how far ahead it
+# compares them, in multiples of the shortest payback time.  A wall
+# time budget in seconds can be set as well, at the cost of repeatable
+# results.
+LOOKAHEAD_DEPTH = 1
+LOOKAHEAD_HORIZON = 0.5
+DECISION_TIME_BUDGET = None
+
+# Rollouts remembered by strategy_lookahead before the memo is emptied
+LOOKAHEAD_CACHE_SIZE = 100000
+
+# History recording modes: every purchase, every sample_every-th
+# purchase, or only the initial entry
+HISTORY_FULL = "full"
+HISTORY_SAMPLED = "sampled"
+HISTORY_OFF = "off"
+
+class HistoryView:
+    """
+    Read-only sequence of the (time, item, cost of item, total cookies)
+    tuples recorded by a ClickerState, built on demand from its
+    history columns.
+    """
+
+    def __init__(self, state):
+        self._state = state
+
+    def __len__(self):
+        """
+        Return the number of history entries
+        """
+        return len(self._state._history_times)
+
+    def __getitem__(self, index):
+        """
+        Return one history tuple, or a list of them for a slice
+        """
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("history index out of range")
+        state = self._state
+        item_id = state._history_items[index]
+        if item_id < 0:
+            item = None
+        else:
+            item = state._item_names[item_id]
+        return (state._history_times[index], item,
+                state._history_costs[index], state._history_totals[index])
+
+    def __iter__(self):
+        """
+        Iterate over the history tuples in order
+        """
+        for index in range(len(self)):
+            yield self[index]
+
 class ClickerState:
     """
     Simple class to keep track of the game state.
     """
 
-    def __init__(self):
+    def __init__(self, history_mode=HISTORY_FULL, sample_every=1):
         self._total_cookies = 0.0
         self._current_cookies = 0.0
         self._current_time = 0.0
         self._current_cps = 1.0
-        self._history = [ (0.0, None, 0.0, 0.0) ]
-        # self._history = [ (self._current_time, self._current_item,
-        #                self._cost_item, self._total_cookies) ]
+
+        # History is kept as columns, with item names interned as
+        # indices into _item_names and -1 standing for None
+        self._history_mode = history_mode
+        self._sample_every = sample_every
+        self._purchases = 0
+        self._item_names = []
+        self._item_ids = {}
+        self._history_times = array.array("d")
+        self._history_items = array.array("i")
+        self._history_costs = array.array("d")
+        self._history_totals = array.array("d")
+        self._record_history(0.0, None, 0.0, 0.0)
 
     def __str__(self):
         """
@@ -48,6 +116,22 @@ class ClickerState:
         """
         return self._current_cookies
 
+    def get_total_cookies(self):
+        """
+        Return total number of cookies produced so far
+
+        Should return a float
+        """
+        return self._total_cookies
+
+    def get_purchase_count(self):
+        """
+        Return number of items bought so far, whatever the history mode
+
+        Should return an integer
+        """
+        return self._purchases
+
     def get_cps(self):
         """
         Get current CPS
@@ -76,7 +160,71 @@ class ClickerState:
         Should return a copy of any internal data structures,
         so that they will not be modified outside of the class.
         """
-        return self._history
+        return list(HistoryView(self))
+
+    def get_history_view(self):
+        """
+        Return a read-only view of the history that builds each
+        tuple when it is read, instead of copying the whole list
+        """
+        return HistoryView(self)
+
+    def get_history_mode(self):
+        """
+        Return the history mode this state was created with
+        """
+        return self._history_mode
+
+    def get_history_columns(self):
+        """
+        Return the history as (times, item ids, costs, total cookies)
+        arrays plus the list of item names the ids index.  The arrays
+        support the buffer protocol, so numpy.frombuffer can wrap them
+        without copying.  They are shared with the state and must not
+        be modified.
+        """
+        return (self._history_times, self._history_items,
+                self._history_costs, self._history_totals, self._item_names)
+
+    def _record_history(self, current_time, item_name, cost, total_cookies):
+        """
+        Append one history entry to the columns
+        """
+        if item_name == None:
+            item_id = -1
+        elif item_name in self._item_ids:
+            item_id = self._item_ids[item_name]
+        else:
+            item_id = len(self._item_names)
+            self._item_ids[item_name] = item_id
+            self._item_names.append(item_name)
+        self._history_times.append(current_time)
+        self._history_items.append(item_id)
+        self._history_costs.append(cost)
+        self._history_totals.append(total_cookies)
+
+    def record_purchase(self, current_time, item_name, cost, total_cookies, count=1):
+        """
+        Count a purchase and record it in the history if the history
+        mode keeps it.  buy_item calls this; simulators that track the
+        cookies themselves call it directly.  A count above 1 counts
+        several purchases at once and is only meant for HISTORY_OFF.
+        """
+        self._purchases += count
+        if self._history_mode == HISTORY_FULL:
+            self._record_history(current_time, item_name, cost, total_cookies)
+        elif self._history_mode == HISTORY_SAMPLED and self._purchases % self._sample_every == 0:
+            self._record_history(current_time, item_name, cost, total_cookies)
+
+    def set_state(self, current_time, cookies, total_cookies, cps):
+        """
+        Set the time, current cookies, total cookies and CPS, for
+        simulators that keep them outside the state while they run
+        """
+        self._current_time = current_time
+        self._current_cookies = cookies
+        self._total_cookies = total_cookies
+        self._current_cps = cps
 
     def time_until(self, cookies):
         """
@@ -90,18 +238,18 @@ class ClickerState:
         else:
             return float( math.ceil( (cookies-self.get_cookies()) / self.get_cps() ) )
 
-    def wait(self, time):
+    def wait(self, wait_time):
         """
         Wait for given amount of time and update state
 
-        Should do nothing if time <= 0.0
+        Should do nothing if wait_time <= 0.0
         """
-        if time <= 0.0:
+        if wait_time <= 0.0:
             return
         else:
-            self._current_time = self.get_time() + time
-            self._current_cookies += self.get_cps() * time
-            self._total_cookies += self.get_cps() * time
+            self._current_time = self.get_time() + wait_time
+            self._current_cookies += self.get_cps() * wait_time
+            self._total_cookies += self.get_cps() * wait_time
 
     def buy_item(self, item_name, cost, additional_cps):
         """
@@ -114,20 +262,187 @@ class ClickerState:
         else:
             self._current_cookies -= cost
             self._current_cps += additional_cps
-            self._history.append( (self.get_time(), item_name,
-                                   cost, self._total_cookies) )
+            self.record_purchase(self.get_time(), item_name,
+                                  cost, self._total_cookies)
 
 
-def simulate_clicker(build_info, duration, strategy):
+class IndexedBuildInfo:
+    """
+    Build catalogue with the same interface as provided.BuildInfo,
+    stored in arrays and indexed so that strategies can find the
+    cheapest, the most expensive and the best CPS/cost item they can
+    afford without scanning every item.
+    """
+
+    def __init__(self, build_info=None, growth_factor=None):
+        if build_info == None:
+            build_info = provided.BuildInfo()
+        if growth_factor == None:
+            growth_factor = getattr(build_info, "_build_growth", provided.BUILD_GROWTH)
+        if isinstance(build_info, dict):
+            names = sorted(build_info.keys())
+            costs = [build_info[name][0] for name in names]
+            cpss = [build_info[name][1] for name in names]
+        else:
+            names = sorted(build_info.build_items())
+            costs = [build_info.get_cost(name) for name in names]
+            cpss = [build_info.get_cps(name) for name in names]
+
+        self._build_growth = growth_factor
+        self._names = names
+        self._index = dict([(name, index) for index, name in enumerate(names)])
+        self._costs = array.array("d", costs)
+        self._cpss = array.array("d", cpss)
+
+        # Heaps may hold stale entries for items whose cost has since
+        # changed; they are dropped when they reach the top.  Ties go
+        # to the item a linear scan in build_items order would pick.
+        self._cost_heap = [(costs[index], -index, costs[index]) for index in range(len(names))]
+        self._ratio_heap = [(-self._ratio(index), -index, costs[index]) for index in range(len(names))]
+        heapq.heapify(self._cost_heap)
+        heapq.heapify(self._ratio_heap)
+        # Sorted list for most_expensive_item.  Updates move entries
+        # with del and insort; that is O(n), but a memmove in C, which
+        # measured faster than shifting only the entries passed over.
+        self._by_cost = sorted([(costs[index], index) for index in range(len(names))])
+
+    def _ratio(self, index):
+        """
+        Return the CPS/cost ratio of an item, computed as strategy_best does
+        """
+        return self._cpss[index] / (self._costs[index]*1.0)
+
+    def build_items(self):
+        """
+        Get a list of buildable items
+        """
+        return list(self._names)
+
+    def get_cost(self, item):
+        """
+        Get the current cost of an item
+        """
+        return self._costs[self._index[item]]
+
+    def get_cps(self, item):
+        """
+        Get the current CPS of an item
+        """
+        return self._cpss[self._index[item]]
+
+    def update_item(self, item):
+        """
+        Update the cost of an item by the growth factor.  The heap
+        pushes are O(log n), but moving the item in the sorted cost
+        list shifts the entries after it, so an update is O(n).
+        """
+        index = self._index[item]
+        old_cost = self._costs[index]
+        new_cost = old_cost * self._build_growth
+        self._costs[index] = new_cost
+
+        heapq.heappush(self._cost_heap, (new_cost, -index, new_cost))
+        heapq.heappush(self._ratio_heap, (-self._ratio(index), -index, new_cost))
+        if len(self._cost_heap) > 2 * len(self._names):
+            self._compact_heaps()
+
+        del self._by_cost[bisect.bisect_left(self._by_cost, (old_cost, index))]
+        bisect.insort(self._by_cost, (new_cost, index))
+
+    def _compact_heaps(self):
+        """
+        Rebuild the heaps without their stale entries
+        """
+        self._cost_heap = [entry for entry in self._cost_heap
+                           if entry[2] == self._costs[-entry[1]]]
+        self._ratio_heap = [entry for entry in self._ratio_heap
+                            if entry[2] == self._costs[-entry[1]]]
+        heapq.heapify(self._cost_heap)
+        heapq.heapify(self._ratio_heap)
+
+    def _drop_stale(self, heap):
+        """
+        Pop stale entries off the top of a heap
+        """
+        while heap and heap[0][2] != self._costs[-heap[0][1]]:
+            heapq.heappop(heap)
+
+    def cheapest_item(self, max_cost):
+        """
+        Return the cheapest item costing at most max_cost, or None
+        """
+        self._drop_stale(self._cost_heap)
+        if self._cost_heap and self._cost_heap[0][0] <= max_cost:
+            return self._names[-self._cost_heap[0][1]]
+        return None
+
+    def most_expensive_item(self, max_cost):
+        """
+        Return the most expensive item costing at most max_cost, or None
+        """
+        position = bisect.bisect_right(self._by_cost, (max_cost, len(self._names))) - 1
+        if position < 0:
+            return None
+        # Of several items with the same cost, a linear scan keeps the first
+        cost = self._by_cost[position][0]
+        return self._names[self._by_cost[bisect.bisect_left(self._by_cost, (cost, -1))][1]]
+
+    def best_ratio_item(self, max_cost):
+        """
+        Return the item with the highest CPS/cost ratio among those
+        costing at most max_cost, or None.  The heap is walked as a
+        tree without changing it, and the walk only goes below entries
+        that are stale or unaffordable, so a query costs O(k) for the k
+        entries that rank above the answer.
+        """
+        self._drop_stale(self._ratio_heap)
+        heap = self._ratio_heap
+        best = None
+        stack = [0]
+        while stack:
+            position = stack.pop()
+            if position >= len(heap):
+                continue
+            entry = heap[position]
+            if best != None and entry >= best:
+                continue
+            if entry[2] <= max_cost and entry[2] == self._costs[-entry[1]]:
+                best = entry
+            else:
+                stack.append(2 * position + 1)
+                stack.append(2 * position + 2)
+        if best == None:
+            return None
+        return self._names[-best[1]]
+
+    def clone(self):
+        """
+        Return a clone of this catalogue
+        """
+        new_info = IndexedBuildInfo({}, self._build_growth)
+        new_info._names = self._names
+        new_info._index = self._index
+        new_info._costs = array.array("d", self._costs)
+        new_info._cpss = self._cpss
+        new_info._cost_heap = list(self._cost_heap)
+        new_info._ratio_heap = list(self._ratio_heap)
+        new_info._by_cost = list(self._by_cost)
+        return new_info
+
+
+def simulate_clicker(build_info, duration, strategy,
+                     history_mode=HISTORY_FULL, sample_every=1):
     """
     Function to run a Cookie Clicker game for the given
     duration with the given strategy.  Returns a ClickerState
     object corresponding to the final state of the game.
+    Strategies get a read-only view of the history.
     """
 
     # Replace with your code
     copy = build_info.clone()
-    clicker_state = ClickerState()
+    clicker_state = ClickerState(history_mode, sample_every)
+    history = clicker_state.get_history_view()
     present_time = 0.0
 
     while True:
@@ -136,7 +451,7 @@ def simulate_clicker(build_info, duration, strategy):
         else:
             item = strategy(clicker_state.get_cookies(),
                             clicker_state.get_cps(),
-                            clicker_state.get_history(),
+                            history,
                             duration-present_time, copy)
 
             if item == None:
@@ -187,6 +502,9 @@ def strategy_cheap(cookies, cps, history, time_left, build_info):
     Always buy the cheapest item you can afford in the time left.
     """
     total_cookies = cookies + cps*time_left
+    if isinstance(build_info, IndexedBuildInfo):
+        return build_info.cheapest_item(total_cookies)
+
     min_val = total_cookies
     item_name = None
 
@@ -204,6 +522,9 @@ def strategy_expensive(cookies, cps, history, time_left, build_info):
     Always buy the most expensive item you can afford in the time left.
     """
     total_cookies = cookies + cps*time_left
+    if isinstance(build_info, IndexedBuildInfo):
+        return build_info.most_expensive_item(total_cookies)
+
     max_val = float('-inf')
     item_name = None
 
@@ -221,6 +542,9 @@ def strategy_best(cookies, cps, history, time_left, build_info):
     The best strategy that you are able to implement.
     """
     total_cookies = cookies + cps*time_left
+    if isinstance(build_info, IndexedBuildInfo):
+        return build_info.best_ratio_item(total_cookies)
+
     best_cps_to_cost_ratio = float('-inf')
     item_name = None
 
@@ -234,32 +558,475 @@ def strategy_best(cookies, cps, history, time_left, build_info):
 
     return item_name
 
-def run_strategy(strategy_name, time, strategy):
+class _SearchTimeout(Exception):
+    """
+    Raised inside the lookahead search when the decision time budget
+    runs out.
+    """
+    pass
+
+# Cookies produced by strategy_best from a search state to its horizon,
+# shared by consecutive decisions
+_ROLLOUTS = {}
+
+class _LookaheadSearch:
+    """
+    Search over sequences of purchases.  Each sequence is followed by
+    strategy_best up to a horizon, and scored by the total cookies
+    produced by then.  Only the items that can be bought no later than
+    the one strategy_best would buy are searched, so a search of depth
+    d over n items makes at most n + n**2 + ... + n**d rollouts.
+    """
+
+    def __init__(self, cookies, cps, time_left, build_info, deadline=None):
+        self._cookies = cookies
+        self._cps = cps
+        self._time_left = time_left
+        self._deadline = deadline
+        self._names = list(build_info.build_items())
+        self._costs = [build_info.get_cost(item) for item in self._names]
+        self._cpss = [build_info.get_cps(item) for item in self._names]
+        self._ratios = [self._cpss[index] / self._costs[index] for index in range(len(self._names))]
+        self._growth = getattr(build_info, "_build_growth", provided.BUILD_GROWTH)
+
+        # Compare sequences over LOOKAHEAD_HORIZON times the soonest any
+        # item pays for itself; items without CPS never do.  The span
+        # is rounded up to a power of two and the horizon put on a grid
+        # of that spacing, so consecutive decisions often share a
+        # horizon and can reuse each other's rollouts.
+        paybacks = [self._wait(cookies, cps, self._costs[index]) + 1.0 / self._ratios[index]
+                    for index in range(len(self._names)) if self._ratios[index] > 0.0]
+        span = min([time_left] + [LOOKAHEAD_HORIZON * payback for payback in paybacks])
+        spacing = 2.0 ** math.ceil(math.log(max(span, 1.0), 2))
+        self._horizon_left = max(0.0, (math.ceil(time_left / spacing) - 2) * spacing)
+        self._horizon = time_left - self._horizon_left
+        self._catalogue = (tuple(self._cpss), self._growth)
+
+    def best_item(self, depth):
+        """
+        Search depth purchases ahead.
+
+        Returns the first item of the best sequence, or None if
+        nothing can be bought in the time left
+        """
+        best_item = None
+        best_total = float('-inf')
+        for index in self._candidates(0.0, self._cookies, self._cps):
+            total = self._buy(index, 0.0, self._cookies, self._cps, 0.0, depth)
+            if total > best_total:
+                best_total = total
+                best_item = self._names[index]
+        return best_item
+
+    def _wait(self, cookies, cps, cost):
+        """
+        Return the time until cost can be paid, rounded up to a whole
+        second as in ClickerState.time_until
+        """
+        if cost <= cookies:
+            return 0.0
+        return float(math.ceil((cost-cookies) / cps))
+
+    def _candidates(self, present_time, cookies, cps):
+        """
+        Return the items worth searching from a state, best ratio
+        first: those that can be bought in the time left no later than
+        the item strategy_best would buy.
+        """
+        time_left = self._time_left - present_time
+        total_cookies = cookies + cps*time_left
+        greedy = None
+        for index in range(len(self._names)):
+            if self._costs[index] <= total_cookies:
+                if greedy == None or self._ratios[index] >= self._ratios[greedy]:
+                    greedy = index
+        if greedy == None:
+            return []
+
+        limit = min(self._wait(cookies, cps, self._costs[greedy]), time_left)
+        candidates = [index for index in range(len(self._names))
+                      if self._wait(cookies, cps, self._costs[index]) <= limit]
+        candidates.sort(key=lambda index: -self._ratios[index])
+        return candidates
+
+    def _buy(self, index, present_time, cookies, cps, produced, depth):
+        """
+        Wait for an item, buy it and search the rest of the sequence.
+
+        Returns the best total found below it
+        """
+        cost = self._costs[index]
+        ratio = self._ratios[index]
+        wait = self._wait(cookies, cps, cost)
+        if present_time + wait > self._horizon:
+            return produced + cps*(self._horizon-present_time)
+        self._costs[index] = cost * self._growth
+        self._ratios[index] = self._cpss[index] / self._costs[index]
+        try:
+            return self._search(present_time+wait, cookies + cps*wait - cost,
+                                cps + self._cpss[index], produced + cps*wait, depth-1)
+        finally:
+            self._costs[index] = cost
+            self._ratios[index] = ratio
+
+    def _search(self, present_time, cookies, cps, produced, depth):
+        """
+        Return the best total reachable with depth more purchases
+        chosen freely, then strategy_best.
+        """
+        if self._deadline is not None and time.time() > self._deadline:
+            raise _SearchTimeout()
+        if present_time >= self._horizon:
+            return produced
+
+        best_total = self._rollout(present_time, cookies, cps, produced)
+        if depth > 0:
+            for index in self._candidates(present_time, cookies, cps):
+                best_total = max(best_total, self._buy(index, present_time, cookies, cps,
+                                                       produced, depth))
+        return best_total
+
+    def _rollout(self, present_time, cookies, cps, produced):
+        """
+        Follow strategy_best until the horizon, reusing the result of
+        an earlier decision that reached the same state.
+
+        Returns the total cookies produced by the horizon
+        """
+        key = (tuple(self._costs), cookies, cps, self._time_left - present_time,
+               self._horizon_left, self._catalogue)
+        gain = _ROLLOUTS.get(key)
+        if gain == None:
+            gain = self._follow_best(present_time, cookies, cps)
+            if len(_ROLLOUTS) >= LOOKAHEAD_CACHE_SIZE:
+                _ROLLOUTS.clear()
+            _ROLLOUTS[key] = gain
+        return produced + gain
+
+    def _follow_best(self, present_time, cookies, cps):
+        """
+        Follow strategy_best from a state until the horizon.
+
+        Returns the cookies produced by the horizon
+        """
+        costs = list(self._costs)
+        ratios = list(self._ratios)
+        cpss = self._cpss
+        growth = self._growth
+        ceil = math.ceil
+        # Work in time remaining before the horizon
+        time_left = self._horizon - present_time
+        produced = 0.0
+        while True:
+            total_cookies = cookies + cps*time_left
+            # The best ratio of all wins if it is affordable and not
+            # tied; otherwise scan as strategy_best does
+            best_ratio = max(ratios)
+            best_index = ratios.index(best_ratio)
+            cost = costs[best_index]
+            if cost > total_cookies or ratios.count(best_ratio) > 1:
+                best_index = None
+                for index in range(len(costs)):
+                    if costs[index] <= total_cookies:
+                        if best_index == None or ratios[index] >= ratios[best_index]:
+                            best_index = index
+                if best_index == None:
+                    return produced + cps*time_left
+                cost = costs[best_index]
+
+            if cost <= cookies:
+                cookies -= cost
+            else:
+                wait = float(ceil((cost-cookies) / cps))
+                if wait > time_left:
+                    return produced + cps*time_left
+                time_left -= wait
+                produced += cps*wait
+                cookies += cps*wait - cost
+            cps += cpss[best_index]
+            costs[best_index] = cost * growth
+            ratios[best_index] = cpss[best_index] / costs[best_index]
+
+def strategy_lookahead(cookies, cps, history, time_left, build_info):
+    """
+    Search sequences of up to LOOKAHEAD_DEPTH purchases, each finished
+    off with strategy_best, and buy the first item of the one that has
+    produced the most cookies about LOOKAHEAD_HORIZON paybacks from
+    now.  The search deepens one purchase at a time.  If
+    DECISION_TIME_BUDGET is set and runs out, it uses the deepest
+    finished search, or strategy_best if none finished.
+    """
+    deadline = None
+    if DECISION_TIME_BUDGET is not None:
+        deadline = time.time() + DECISION_TIME_BUDGET
+    search = _LookaheadSearch(cookies, cps, time_left, build_info, deadline)
+    item_name = None
+    try:
+        for depth in range(1, LOOKAHEAD_DEPTH + 1):
+            item_name = search.best_item(depth)
+            if item_name == None:
+                break
+    except _SearchTimeout:
+        if item_name == None:
+            return strategy_best(cookies, cps, history, time_left, build_info)
+    return item_name
+
+# Strategies that always return the same item.  simulate_clicker_fast
+# buys that item back to back without calling the strategy again.
+CONSTANT_STRATEGIES = {strategy_cursor_broken: "Cursor",
+                       strategy_none: None}
+
+def _cost_key(cost, cps):
+    """
+    Rank items by cost, as strategy_cheap does
+    """
+    return cost
+
+def _negated_cost_key(cost, cps):
+    """
+    Rank items by cost, highest first, as strategy_expensive does
+    """
+    return -cost
+
+def _ratio_key(cost, cps):
     """
-    Run a simulation for the given time with one strategy.
+    Rank items by CPS/cost ratio, highest first, as strategy_best does
     """
-    state = simulate_clicker(provided.BuildInfo(), time, strategy)
+    return -(cps / (cost*1.0))
+
+# Strategies that buy the affordable item with the lowest key, and
+# whether their scan over build_items keeps the last or the first of
+# several affordable items with equal keys.  simulate_clicker_fast
+# makes the same choice itself instead of calling the strategy.
+RANKED_STRATEGIES = {strategy_cheap: (_cost_key, True),
+                     strategy_expensive: (_negated_cost_key, False),
+                     strategy_best: (_ratio_key, True)}
+
+def _zero_wait_run(cost, item_cps, cookies, growth, rank, other_key):
+    """
+    Count the purchases of one item that can be made back to back
+    without waiting, starting with one already chosen, while its key
+    stays below other_key.  Uses the closed form of the geometric sum
+    of its growing costs.
+
+    Returns the number of purchases, at least 1
+    """
+    def possible(count):
+        if cost * (growth**count - 1.0) / (growth - 1.0) > cookies:
+            return False
+        return (rank(cost * growth, item_cps) < other_key
+                and rank(cost * growth**(count - 1), item_cps) < other_key)
+
+    if growth <= 1.0 or not possible(2):
+        return 1
+    # Checking the second and the last purchase covers keys that rise
+    # and keys that fall with cost, so possible is true up to a limit
+    low = 2
+    high = int(math.log(1.0 + cookies * (growth - 1.0) / cost) / math.log(growth)) + 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        if possible(middle):
+            low = middle
+        else:
+            high = middle
+    return low
+
+def _simulate_ranked(copy, duration, rank, last_on_tie, clicker_state):
+    """
+    Run a game for a strategy in RANKED_STRATEGIES, choosing each item
+    from local lists of costs and keys with the same comparisons as the
+    strategy.  With history off, items bought back to back without
+    waiting are bought in closed form by _zero_wait_run.
+
+    Returns the final time, cookies, total cookies and CPS
+    """
+    names = copy.build_items()
+    costs = [copy.get_cost(name) for name in names]
+    cpss = [copy.get_cps(name) for name in names]
+    keys = [rank(costs[index], cpss[index]) for index in range(len(names))]
+    growth = getattr(copy, "_build_growth", provided.BUILD_GROWTH)
+    closed_form = clicker_state.get_history_mode() == HISTORY_OFF
+    present_time = 0.0
+    cookies = 0.0
+    total_cookies = 0.0
+    cps = 1.0
+
+    while present_time <= duration:
+        total = cookies + cps*(duration-present_time)
+        choice = None
+        # The item with the lowest key of all is the choice if it is
+        # affordable and no other item shares its key; otherwise scan
+        lowest = min(keys)
+        if keys.count(lowest) == 1 and costs[keys.index(lowest)] <= total:
+            choice = keys.index(lowest)
+        else:
+            best_key = None
+            for index in range(len(names)):
+                if costs[index] <= total:
+                    key = keys[index]
+                    if choice == None or key < best_key or (last_on_tie and key == best_key):
+                        choice = index
+                        best_key = key
+        if choice == None:
+            break
+
+        # Same arithmetic, in the same order, as time_until, wait and
+        # buy_item, so the results match exactly
+        cost = costs[choice]
+        if cost <= cookies:
+            time_needed = 0.0
+        else:
+            time_needed = float(math.ceil((cost-cookies) / cps))
+        if present_time+time_needed > duration:
+            break
+        if time_needed > 0.0:
+            cookies += cps * time_needed
+            total_cookies += cps * time_needed
+        present_time += time_needed
+
+        if closed_form and time_needed == 0.0:
+            other_key = min([keys[index] for index in range(len(names)) if index != choice]
+                            + [float('inf')])
+            count = _zero_wait_run(cost, cpss[choice], cookies, growth, rank, other_key)
+            if count > 1:
+                cookies -= cost * (growth**count - 1.0) / (growth - 1.0)
+                cps += cpss[choice] * count
+                clicker_state.record_purchase(present_time, names[choice], cost,
+                                              total_cookies, count)
+                costs[choice] = cost * growth**count
+                keys[choice] = rank(costs[choice], cpss[choice])
+                continue
+
+        if cost <= cookies:
+            cookies -= cost
+            cps += cpss[choice]
+            clicker_state.record_purchase(present_time, names[choice], cost, total_cookies)
+        costs[choice] = cost * growth
+        keys[choice] = rank(costs[choice], cpss[choice])
+
+    if present_time < duration:
+        cookies += cps * (duration-present_time)
+        total_cookies += cps * (duration-present_time)
+        present_time += (duration-present_time)
+    return present_time, cookies, total_cookies, cps
+
+def simulate_clicker_fast(build_info, duration, strategy,
+                          history_mode=HISTORY_FULL, sample_every=1):
+    """
+    Function to run a Cookie Clicker game like simulate_clicker, but
+    with the game state kept in local variables between purchases.
+    Strategies in CONSTANT_STRATEGIES and RANKED_STRATEGIES are not
+    called at all; their choices are made from local lists instead.
+    Returns a ClickerState object equal to the one simulate_clicker
+    returns, except that with HISTORY_OFF the runs of a ranked
+    strategy that _zero_wait_run sums in closed form may differ from
+    it by rounding.
+    """
+    copy = build_info.clone()
+    clicker_state = ClickerState(history_mode, sample_every)
+    history = clicker_state.get_history_view()
+
+    # Look strategies up by the original function if they are wrapped,
+    # as instrumentation does
+    original = getattr(strategy, "__wrapped__", strategy)
+    if original in RANKED_STRATEGIES:
+        rank, last_on_tie = RANKED_STRATEGIES[original]
+        clicker_state.set_state(*_simulate_ranked(copy, duration, rank,
+                                                  last_on_tie, clicker_state))
+        return clicker_state
+
+    present_time = 0.0
+    cookies = 0.0
+    total_cookies = 0.0
+    cps = 1.0
+    constant = original in CONSTANT_STRATEGIES
+    while present_time <= duration:
+        if constant:
+            item = CONSTANT_STRATEGIES[original]
+        else:
+            item = strategy(cookies, cps, history, duration-present_time, copy)
+        if item == None:
+            break
+
+        # Same arithmetic, in the same order, as time_until, wait and
+        # buy_item, so the results match exactly
+        cost = copy.get_cost(item)
+        if cost <= cookies:
+            time_needed = 0.0
+        else:
+            time_needed = float(math.ceil((cost-cookies) / cps))
+        if present_time+time_needed > duration:
+            break
+        if time_needed > 0.0:
+            cookies += cps * time_needed
+            total_cookies += cps * time_needed
+        present_time += time_needed
+        if cost <= cookies:
+            cookies -= cost
+            cps += copy.get_cps(item)
+            clicker_state.record_purchase(present_time, item, cost, total_cookies)
+        copy.update_item(item)
+
+    if present_time < duration:
+        cookies += cps * (duration-present_time)
+        total_cookies += cps * (duration-present_time)
+        present_time += (duration-present_time)
+
+    clicker_state.set_state(present_time, cookies, total_cookies, cps)
+    return clicker_state
+
+def run_strategy(strategy_name, duration, strategy, plot=False):
+    """
+    Run a simulation for the given duration with one strategy.
+    """
+    state = simulate_clicker(provided.BuildInfo(), duration, strategy)
     print strategy_name, ":", state
 
     # Plot total cookies over time
-
-    # Uncomment out the lines below to see a plot of total cookies vs. time
     # Be sure to allow popups, if you do want to see it
+    if plot:
+        import simpleplot
+        history = state.get_history()
+        history = [(item[0], item[3]) for item in history]
+        simpleplot.plot_lines(strategy_name, 1000, 400, 'Time', 'Total Cookies', [history], True)
+
+# Strategies run by run, in order.  strategy_lookahead is left out, as
+# it is far slower than strategy_best for very little gain.
+STRATEGIES = [("Cursor", strategy_cursor_broken),
+              ("Cheap", strategy_cheap),
+              ("Expensive", strategy_expensive),
+              ("Best", strategy_best)]
 
-    # history = state.get_history()
-    # history = [(item[0], item[3]) for item in history]
-    # simpleplot.plot_lines(strategy_name, 1000, 400, 'Time', 'Total Cookies', [history], True)
+def run(duration=SIM_TIME, strategy_names=None, plot=False):
+    """
+    Run the simulator, for every strategy or only the named ones.
+    """
+    for strategy_name, strategy in STRATEGIES:
+        if strategy_names is None or strategy_name in strategy_names:
+            run_strategy(strategy_name, duration, strategy, plot)
 
-def run():
+def main(argv=None):
     """
-    Run the simulator.
+    Run the simulator from the command line.
     """
-    run_strategy("Cursor", SIM_TIME, strategy_cursor_broken)
+    import argparse
+
+    # Used to increase the timeout, if necessary
+    try:
+        import codeskulptor
+        codeskulptor.set_timeout(20)
+    except ImportError:
+        pass
 
-    # Add calls to run_strategy to run additional strategies
-    run_strategy("Cheap", SIM_TIME, strategy_cheap)
-    run_strategy("Expensive", SIM_TIME, strategy_expensive)
-    run_strategy("Best", SIM_TIME, strategy_best)
+    parser = argparse.ArgumentParser(description="Simulate Cookie Clicker strategies.")
+    parser.add_argument("--time", type=float, default=SIM_TIME, help="seconds to simulate")
+    parser.add_argument("--strategy", action="append", dest="strategies",
+                        choices=[name for name, dummy_strategy in STRATEGIES],
+                        help="strategy to run, may be repeated; all by default")
+    parser.add_argument("--plot", action="store_true", help="plot total cookies over time")
+    args = parser.parse_args(argv)
+    run(args.time, args.strategies, args.plot)
 
-run()
+if __name__ == "__main__":
+    main()
 
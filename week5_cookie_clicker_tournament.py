@@ -0,0 +1,82 @@
+"""
+Cookie Clicker Tournament
+Runs simulate_clicker for every combination of strategy, duration and
+build catalogue across a process pool and collects the results.
+"""
+
+import csv
+import time
+import week5_cookie_clicker as clicker
+
+provided = clicker.provided
+
+# The strategies bundled with the simulator
+BUNDLED_STRATEGIES = {"Cursor": clicker.strategy_cursor_broken,
+                      "Cheap": clicker.strategy_cheap,
+                      "Expensive": clicker.strategy_expensive,
+                      "Best": clicker.strategy_best}
+
+# Columns of a results row
+RESULT_COLUMNS = ("strategy", "duration", "build", "total_cookies",
+                  "cookies", "cps", "purchases", "wall_time")
+
+def _run_game(args):
+    """
+    Run one simulation in a worker process and return its results row.
+    """
+    strategy_name, strategy, duration, build_name, build_info, simulator = args
+    start = time.time()
+    state = simulator(build_info, duration, strategy, clicker.HISTORY_OFF)
+    wall_time = time.time() - start
+    return (strategy_name, duration, build_name, state.get_total_cookies(),
+            state.get_cookies(), state.get_cps(), state.get_purchase_count(), wall_time)
+
+def run_tournament(strategies=None, durations=(clicker.SIM_TIME, ),
+                   build_infos=None, processes=None, simulator=None):
+    """
+    Run simulator (clicker.simulate_clicker, looked up when called, by
+    default) for every combination of the given strategies (a
+    dict of name to strategy function), durations and build catalogues
+    (a dict of name to BuildInfo).  Strategies must be module-level
+    functions so they can be sent to worker processes; processes=1
+    runs every game in this process.
+
+    Returns a list of rows with the fields in RESULT_COLUMNS, ordered
+    by strategy name, duration and build name.  Apart from wall_time,
+    the rows are the same on every run.
+    """
+    if strategies is None:
+        strategies = BUNDLED_STRATEGIES
+    if build_infos is None:
+        build_infos = {"Default": provided.BuildInfo()}
+    if simulator is None:
+        simulator = clicker.simulate_clicker
+
+    games = []
+    for strategy_name in sorted(strategies):
+        for duration in sorted(durations):
+            for build_name in sorted(build_infos):
+                games.append((strategy_name, strategies[strategy_name], duration,
+                              build_name, build_infos[build_name], simulator))
+
+    if processes == 1:
+        return [_run_game(game) for game in games]
+
+    import multiprocessing
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_run_game, games, 1)
+    finally:
+        pool.close()
+        pool.join()
+
+def write_results(filename, results):
+    """
+    Write tournament results to a CSV file, one row per game.
+    """
+    with open(filename, "w") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(RESULT_COLUMNS)
+        for row in results:
+            writer.writerow([repr(value) if isinstance(value, float) else value
+                             for value in row])